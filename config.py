@@ -18,7 +18,8 @@ COLLECTIONS = {
     "document_requests": "document_requests_v1",
     "adk_sessions": "adk_sessions_v1",
     "user_profiles": "user_profiles_v1",
-    "system_metadata": "system_metadata_v1"
+    "system_metadata": "system_metadata_v1",
+    "content_hashes": "content_hashes_v1"
 }
 
 # To add a new collection:
@@ -140,6 +141,15 @@ COLLECTION_SCHEMAS = {
             "value": "1.0.0",
             "category": "system"
         }
+    },
+    "content_hashes": {
+        "fields": {
+            "storage_path": "string",  # Document ID is the SHA-256 of the message content
+            "created_at": "timestamp"
+        },
+        "sample_data": {
+            "storage_path": "messages/2024/01/01/conv_sample_001/msg_sample_001.txt"
+        }
     }
 }
 
@@ -164,7 +174,8 @@ API_CONFIG = {
     "adk_base_url": os.getenv("ADK_BASE_URL", "http://localhost:8000"),
     "frontend_port": int(os.getenv("FRONTEND_PORT", "8501")),
     "backend_port": int(os.getenv("BACKEND_PORT", "8080")),
-    "adk_port": int(os.getenv("ADK_PORT", "8000"))
+    "adk_port": int(os.getenv("ADK_PORT", "8000")),
+    "cors_origins": [origin.strip() for origin in os.getenv("CORS_ORIGINS", "http://localhost:8501").split(",") if origin.strip()]
 }
 
 # Firestore Configuration
@@ -195,13 +206,22 @@ PRODUCTION_STORAGE = {
     "bucket_name": os.getenv('GOOGLE_CLOUD_STORAGE_BUCKET', 'intellisurf-ai-storage'),
     "content_size_threshold": int(os.getenv("CONTENT_SIZE_THRESHOLD", "500000")),  # 500KB
     "use_cloud_storage": bool(os.getenv("USE_CLOUD_STORAGE", "true").lower() == "true"),
-    "cleanup_days": int(os.getenv("CLEANUP_OLD_CONTENT_DAYS", "30"))
+    "cleanup_days": int(os.getenv("CLEANUP_OLD_CONTENT_DAYS", "30")),
+    "read_cache_size": int(os.getenv("READ_CACHE_SIZE", "4096")),
+    "read_cache_ttl": float(os.getenv("READ_CACHE_TTL", "30")),  # seconds
+    "gcs_parallelism": int(os.getenv("GCS_PARALLELISM", "16")),
+    "content_cache_chars": int(os.getenv("CONTENT_CACHE_CHARS", str(128 * 1024 * 1024))),
+    "conversation_log": os.getenv("CONVERSATION_LOG", "false").lower() == "true",
+    "message_cache_blob": os.getenv("MESSAGE_CACHE_BLOB", "false").lower() == "true"
 }
 
 # Google Cloud Storage Configuration
 GCS_CONFIG = {
     "bucket_name": os.getenv('GOOGLE_CLOUD_STORAGE_BUCKET', 'intellisurf-ai-storage'),
-    "use_gcs_for_uploads": os.getenv('USE_GCS_FOR_UPLOADS', 'false').lower() == 'true'
+    "use_gcs_for_uploads": os.getenv('USE_GCS_FOR_UPLOADS', 'false').lower() == 'true',
+    "upload_chunk_size": int(os.getenv("GCS_UPLOAD_CHUNK_SIZE", "262144")),  # 256KB, must be a multiple of 256KB
+    "http_pool_connections": int(os.getenv("GCS_HTTP_POOL_CONNECTIONS", "32")),
+    "http_pool_maxsize": int(os.getenv("GCS_HTTP_POOL_MAXSIZE", "64"))
 }
 
 # GCS Folder Structure
@@ -334,6 +354,7 @@ ADK_BASE_URL=http://localhost:8000
 FRONTEND_PORT=8501
 BACKEND_PORT=8080
 ADK_PORT=8000
+CORS_ORIGINS=http://localhost:8501
 
 # AI Configuration
 MAX_TOKENS=8192
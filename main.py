@@ -1,17 +1,23 @@
-from fastapi import FastAPI, HTTPException, Depends, Query, Header, File, UploadFile
+from fastapi import FastAPI, HTTPException, Depends, Query, File, UploadFile, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from typing import List, Optional
 from datetime import datetime
 import os
-import uuid
+import re
+import errno
+import time
+import asyncio
+import secrets
+import functools
 import shutil
-import base64
-import mimetypes
-from PIL import Image
+import orjson
+import aiofiles
+from pathlib import Path, PurePosixPath
 import logging
 from dotenv import load_dotenv
 
@@ -24,7 +30,7 @@ from services.adk_service import ADKService
 from services.auth_service import AuthService
 from services.gcs_service import get_gcs_service
 from middleware.error_handler import validation_exception_handler, http_exception_handler, general_exception_handler
-from config import VERTEX_AI_CONFIG, PRODUCTION_STORAGE
+from config import VERTEX_AI_CONFIG, PRODUCTION_STORAGE, API_CONFIG
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -33,7 +39,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="IntelliSurf RFP Research Backend",
     description="FastAPI backend for RFP Research Agent and conversation management",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add exception handlers
@@ -45,10 +52,11 @@ app.add_exception_handler(Exception, general_exception_handler)
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure this for production
+    allow_origins=API_CONFIG["cors_origins"],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,  # let browsers cache preflights for a day
 )
 
 # Security
@@ -62,16 +70,141 @@ message_service = SimpleMessageService(
 auth_service = AuthService()
 rfp_adk_service = ADKService(app_name="rfp-research")
 
+# Upload directory (resolved once so per-request paths are a single join)
+UPLOAD_PATH = Path("uploads").resolve()
+UPLOAD_PATH.mkdir(exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB per read when streaming uploads to disk
+ATTACHMENT_CONCURRENCY = 8  # max attachments relocated at once per chat request
+
 # Mount static files for uploads (only if not using GCS)
 from config import GCS_CONFIG
 if not GCS_CONFIG["use_gcs_for_uploads"]:
-    app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+    app.mount("/uploads", StaticFiles(directory=UPLOAD_PATH), name="uploads")
     # Mount static files for RFP documents
     app.mount("/rfp-documents", StaticFiles(directory="teamcentre_mock/opportunities"), name="rfp_documents")
 
-# Upload directory
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+@app.on_event("startup")
+async def warm_gcs_client():
+    """Build the shared GCS client before the first request needs it."""
+    app.state.gcs = await asyncio.to_thread(get_gcs_service)
+
+@app.on_event("shutdown")
+async def close_adk_client():
+    """Release the pooled connections to the ADK server."""
+    await rfp_adk_service.aclose()
+
+# Sub-agent name -> workflow stage (index into activity_tracker["steps"])
+AGENT_STAGES = {
+    "rfp_coordinator": 1,
+    "teamcentre": 2,
+    "document_ingestion": 3,
+    "proposal_generator": 4
+}
+AGENT_STAGE_PATTERN = re.compile("|".join(AGENT_STAGES), re.IGNORECASE)
+AGENT_STAGE_UPDATES = {
+    1: (60, "RFP Coordinator collecting project details..."),
+    2: (70, "Creating opportunity structure in TeamCentre..."),
+    3: (85, "Processing and ingesting uploaded documents..."),
+    4: (95, "Generating comprehensive proposal document...")
+}
+
+def analyze_agent_events(events: list) -> List[str]:
+    """Collect the agent authors and tool/function names seen in ADK events."""
+    activities = []
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        if event.get("author"):
+            activities.append(event["author"])
+        content = event.get("content")
+        if isinstance(content, dict):
+            for part in content.get("parts") or []:
+                if isinstance(part, dict):
+                    call = part.get("functionCall") or part.get("function_call")
+                    if isinstance(call, dict) and call.get("name"):
+                        activities.append(call["name"])
+    return activities
+
+def apply_agent_stage(activity_tracker: dict, agent_activities: List[str]):
+    """Advance the tracker to the furthest workflow stage found in one pass over the activities."""
+    stage = max(
+        (AGENT_STAGES[match.group(0).lower()] for activity in agent_activities for match in AGENT_STAGE_PATTERN.finditer(activity)),
+        default=0
+    )
+    if not stage:
+        return
+    
+    steps = activity_tracker["steps"]
+    for step in steps[1:stage + 1]:
+        step["status"] = "completed"
+    if stage + 1 < len(steps):
+        steps[stage + 1]["status"] = "in_progress"
+    activity_tracker["progress_percentage"], activity_tracker["message"] = AGENT_STAGE_UPDATES[stage]
+
+def _messages_etag(messages: list) -> str:
+    """Weak ETag for a message page: changes whenever a message is added to it."""
+    last_id = messages[-1]["id"] if messages else "none"
+    return f'W/"{len(messages)}-{last_id}"'
+
+def _json_list_response(adapter, items: list) -> Response:
+    """Validate and serialize a list response with a prebuilt TypeAdapter, skipping jsonable_encoder."""
+    return Response(content=adapter.dump_json(adapter.validate_python(items)), media_type="application/json")
+
+# Strong references so fire-and-forget persistence tasks aren't garbage collected
+_background_tasks = set()
+
+def _persist_in_background(conversation_id: str, role: str, content: str):
+    """Store a message in the threadpool without holding up the response.
+    
+    The message is staged first, so conversation reads include it before the write lands.
+    """
+    message = message_service.stage_message(conversation_id, role, content)
+    task = asyncio.create_task(asyncio.to_thread(message_service.write_staged_message, message))
+    _background_tasks.add(task)
+    task.add_done_callback(functools.partial(_on_background_task_done, message))
+
+def _on_background_task_done(message: dict, task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(
+            f"Background persistence of {message['role']} message {message['id']} in "
+            f"{message['conversation_id']} failed after retries: {task.exception()}"
+        )
+
+def _start_conversation(conversation_id: str, user_id: str, title: str, user_input: str):
+    """Create a conversation and store its first user message."""
+    message_service.create_conversation(conversation_id, user_id, title)
+    message_service.add_message_to_conversation(conversation_id, "user", user_input)
+
+@functools.lru_cache(maxsize=1)
+def _upload_date_prefix(day: int) -> str:
+    """YYYYMMDD for a UTC day number, formatted once per day."""
+    return time.strftime("%Y%m%d", time.gmtime(day * 86400))
+
+async def _relocate_rfp_attachment(attachment_url: str, request_id: str, rfp_documents_dir: Path) -> str:
+    """Move a general upload into an opportunity's documents folder and return its new URL."""
+    if "/uploads/" not in attachment_url:
+        return attachment_url
+    
+    general_filename = attachment_url.split("/")[-1]
+    try:
+        await asyncio.to_thread(_relocate_file, UPLOAD_PATH / general_filename, rfp_documents_dir / general_filename)
+    except FileNotFoundError:
+        return attachment_url
+    except Exception as e:
+        logger.error(f"Error processing RFP attachment {attachment_url}: {str(e)}")
+        return attachment_url
+    
+    return f"/rfp-documents/{request_id}/documents/{general_filename}"
+
+def _relocate_file(src: Path, dst: Path):
+    """Move a file with a rename, copying only when it crosses filesystems."""
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Validate JWT token and return user info - Mock for development"""
@@ -83,14 +216,28 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         "provider": "mock"
     }
 
+# Pre-serialized bodies for the endpoints load balancers poll
+ROOT_BODY = orjson.dumps({"message": "IntelliSurf RFP Research Backend is running"})
+_health_body = {"second": None, "content": b""}
+
 @app.get("/")
 async def root():
-    return {"message": "IntelliSurf RFP Research Backend is running"}
+    return Response(content=ROOT_BODY, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint for Docker"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat(), "version": "1.0.0"}
+    # Rebuild the body at most once per second; timestamp and cache stats are that fresh
+    second = int(time.time())
+    if _health_body["second"] != second:
+        _health_body["content"] = orjson.dumps({
+            "status": "healthy",
+            "timestamp": datetime.now().isoformat(),
+            "version": "1.0.0",
+            "cache": message_service.cache_stats()
+        })
+        _health_body["second"] = second
+    return Response(content=_health_body["content"], media_type="application/json")
 
 # Conversation endpoints
 @app.post("/conversations", response_model=ConversationResponse)
@@ -100,8 +247,9 @@ async def create_conversation(
 ):
     """Create a new conversation"""
     try:
-        conversation_id = f"conv_{uuid.uuid4().hex[:12]}"
-        conversation = message_service.create_conversation(
+        conversation_id = f"conv_{secrets.token_hex(6)}"
+        conversation = await asyncio.to_thread(
+            message_service.create_conversation,
             conversation_id=conversation_id,
             user_id=user["uid"],
             title=request.title
@@ -119,19 +267,33 @@ async def get_conversations(
 ):
     """Get user's conversations with pagination"""
     try:
-        conversations = message_service.get_user_conversations(user["uid"], limit, offset)
-        return conversations
+        conversations = await asyncio.to_thread(message_service.get_user_conversations, user["uid"], limit, offset)
     except Exception as e:
         logger.error(f"Error fetching conversations: {str(e)}")
         return []
+    return _json_list_response(CONVERSATION_LIST_ADAPTER, conversations)
 
 @app.get("/conversations/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
     conversation_id: str,
-    user = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    user = Depends(get_current_user),
+    include_messages: bool = Query(False, description="Return the full message history"),
+    preview: int = Query(1, ge=0, le=5, description="Number of latest messages to include when include_messages is false")
 ):
-    """Get a specific conversation with all messages"""
-    messages = message_service.get_conversation_messages(conversation_id)
+    """Get a specific conversation with its full history or a short preview of the latest messages"""
+    if include_messages:
+        messages = await message_service.aget_conversation_messages(conversation_id)
+    elif preview:
+        messages = await message_service.aget_conversation_messages(conversation_id, preview)
+    else:
+        messages = []
+    
+    etag = _messages_etag(messages)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     
     return {
         "id": conversation_id,
@@ -147,7 +309,8 @@ async def add_message(
     user = Depends(get_current_user)
 ):
     """Add a message to a conversation"""
-    message_id = message_service.add_message_to_conversation(
+    message_id = await asyncio.to_thread(
+        message_service.add_message_to_conversation,
         conversation_id=conversation_id,
         role=request.role,
         content=request.content
@@ -169,7 +332,7 @@ async def update_conversation_title(
 ):
     """Update conversation title"""
     try:
-        success = message_service.update_conversation_title(conversation_id, title)
+        success = await asyncio.to_thread(message_service.update_conversation_title, conversation_id, title)
         if success:
             return {"message": "Title updated successfully"}
         else:
@@ -190,13 +353,21 @@ async def delete_conversation(
 @app.get("/conversations/{conversation_id}/messages", response_model=List[MessageResponse])
 async def get_messages(
     conversation_id: str,
+    request: Request,
     user = Depends(get_current_user),
     limit: int = Query(50, ge=1, le=100),
     before_timestamp: Optional[str] = Query(None)
 ):
     """Get messages from a conversation with pagination"""
-    messages = message_service.get_conversation_messages(conversation_id)
-    return messages[:limit] if messages else []
+    messages = await message_service.aget_conversation_messages(conversation_id, limit, before_timestamp)
+    
+    etag = _messages_etag(messages)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    response = _json_list_response(MESSAGE_LIST_ADAPTER, messages)
+    response.headers["ETag"] = etag
+    return response
 
 
 @app.post("/upload")
@@ -209,13 +380,8 @@ async def upload_file(
     try:
         gcs_service = get_gcs_service()
         
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{timestamp}_{file.filename}"
-        
-        # Read file content
-        content = await file.read()
+        # Generate unique filename from the bare client filename (no directory parts)
+        unique_filename = f"{_upload_date_prefix(int(time.time()) // 86400)}_{secrets.token_hex(4)}_{PurePosixPath(file.filename).name}"
         
         if gcs_service:
             # Upload to GCS
@@ -224,7 +390,10 @@ async def upload_file(
             else:
                 gcs_path = gcs_service.generate_upload_path('uploads', unique_filename)
             
-            file_url = gcs_service.upload_file_content(content, gcs_path, file.content_type)
+            # Stream the spooled upload to GCS in chunk_size pieces, off the event loop
+            file_url, file_size = await asyncio.to_thread(
+                gcs_service.upload_file_stream, file.file, gcs_path, file.content_type
+            )
             
         else:
             # Local storage fallback
@@ -236,20 +405,27 @@ async def upload_file(
                 file_url = f"/rfp-documents/{request_id}/documents/{unique_filename}"
             else:
                 # General upload
-                file_path = os.path.join(UPLOAD_DIR, unique_filename)
+                file_path = UPLOAD_PATH / unique_filename
+                if not file_path.resolve().is_relative_to(UPLOAD_PATH):
+                    raise HTTPException(status_code=400, detail="Invalid filename")
                 file_url = f"/uploads/{unique_filename}"
             
-            # Save file locally
-            with open(file_path, "wb") as buffer:
-                buffer.write(content)
+            # Save file locally in fixed-size chunks
+            file_size = 0
+            async with aiofiles.open(file_path, "wb") as buffer:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    await buffer.write(chunk)
+                    file_size += len(chunk)
         
         return {
             "filename": file.filename,
             "file_url": file_url,
-            "file_size": len(content),
+            "file_size": file_size,
             "upload_time": datetime.now().isoformat(),
             "storage_type": "gcs" if gcs_service else "local"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
@@ -291,167 +467,151 @@ async def rfp_chat_endpoint(
         if streaming:
             return StreamingResponse(
                 stream_rfp_response(user_id, session_id, conversation_id, user_input, attachments, activity_tracker),
-                media_type="text/plain"
+                media_type="text/event-stream",
+                headers=SSE_HEADERS
             )
         
-        # Get or create RFP ADK session
-        activity_tracker["current_step"] = "session_setup"
-        activity_tracker["steps"][0]["status"] = "completed"
-        activity_tracker["steps"][1]["status"] = "in_progress"
-        activity_tracker["progress_percentage"] = 20
-        activity_tracker["message"] = "Setting up agent session and analyzing request..."
-        
-        session_id, session_data = await rfp_adk_service.get_or_create_session(
-            user_id=user_id,
-            session_id=session_id
-        )
+        async def handle_turn() -> dict:
+            nonlocal session_id, conversation_id
+                
+            # Get or create RFP ADK session
+            activity_tracker["current_step"] = "session_setup"
+            activity_tracker["steps"][0]["status"] = "completed"
+            activity_tracker["steps"][1]["status"] = "in_progress"
+            activity_tracker["progress_percentage"] = 20
+            activity_tracker["message"] = "Setting up agent session and analyzing request..."
         
-        # Create Firestore conversation if not provided
-        if not conversation_id:
-            title_words = user_input.split()[:4]
-            title = " ".join(title_words) + ("..." if len(user_input.split()) > 4 else "")
-            
-            conversation_id = f"rfp_{uuid.uuid4().hex[:12]}"
-            message_service.create_conversation(conversation_id, user["uid"], title)
+            session_setup = rfp_adk_service.get_or_create_session(
+                user_id=user_id,
+                session_id=session_id
+            )
         
-        # Add user message
-        message_service.add_message_to_conversation(
-            conversation_id=conversation_id,
-            role="user",
-            content=user_input
-        )
+            # Create the Firestore conversation if not provided and store the user message up front,
+            # concurrently with the session setup, so the turn survives any failure below
+            if not conversation_id:
+                title_words = user_input.split()[:4]
+                title = " ".join(title_words) + ("..." if len(user_input.split()) > 4 else "")
+                
+                conversation_id = f"rfp_{secrets.token_hex(6)}"
+                store_user_message = asyncio.to_thread(_start_conversation, conversation_id, user["uid"], title, user_input)
+            else:
+                store_user_message = asyncio.to_thread(message_service.add_message_to_conversation, conversation_id, "user", user_input)
+            (session_id, session_data), _ = await asyncio.gather(session_setup, store_user_message)
         
-        # Update activity: Processing attachments
-        if attachments:
-            activity_tracker["current_step"] = "processing_attachments"
-            activity_tracker["progress_percentage"] = 30
-            activity_tracker["message"] = f"Processing {len(attachments)} uploaded files..."
+            # Update activity: Processing attachments
+            if attachments:
+                activity_tracker["current_step"] = "processing_attachments"
+                activity_tracker["progress_percentage"] = 30
+                activity_tracker["message"] = f"Processing {len(attachments)} uploaded files..."
         
-        # Process attachments for RFP context
-        processed_attachments = []
-        if attachments:
-            # Try to get current request_id from session or extract from conversation
-            current_request_id = None
-            try:
-                session_data = await rfp_adk_service.get_session(user_id, session_id)
-                if session_data and "request_id" in session_data:
-                    current_request_id = session_data["request_id"]
-            except:
-                pass
-            
-            # Process each attachment with RFP context
-            for attachment_url in attachments:
-                try:
-                    # Convert general upload URLs to RFP-specific paths if needed
-                    if "/uploads/" in attachment_url and current_request_id:
-                        # Move file from general uploads to RFP-specific location
-                        general_filename = attachment_url.split("/")[-1]
-                        general_path = f"uploads/{general_filename}"
-                        
-                        if os.path.exists(general_path):
-                            # Create RFP documents directory
-                            rfp_documents_dir = f"teamcentre_mock/opportunities/{current_request_id}/documents"
-                            os.makedirs(rfp_documents_dir, exist_ok=True)
-                            
-                            # Move file to RFP location
-                            rfp_path = f"{rfp_documents_dir}/{general_filename}"
-                            shutil.move(general_path, rfp_path)
-                            
-                            # Update attachment URL
-                            attachment_url = f"/rfp-documents/{current_request_id}/{general_filename}"
+            # Process attachments for RFP context
+            processed_attachments = []
+            if attachments and GCS_CONFIG["use_gcs_for_uploads"]:
+                # GCS uploads already live at their final object key
+                processed_attachments = list(attachments)
+            elif attachments:
+                # Reuse the session fetched above rather than a second round trip
+                current_request_id = session_data.get("request_id") if session_data else None
+                
+                if current_request_id:
+                    # Create RFP documents directory once for all attachments
+                    rfp_documents_dir = Path("teamcentre_mock/opportunities") / current_request_id / "documents"
+                    await asyncio.to_thread(rfp_documents_dir.mkdir, parents=True, exist_ok=True)
+                    
+                    # Relocate attachments concurrently, bounded per request
+                    semaphore = asyncio.Semaphore(ATTACHMENT_CONCURRENCY)
+                    
+                    async def relocate(attachment_url: str) -> str:
+                        async with semaphore:
+                            return await _relocate_rfp_attachment(attachment_url, current_request_id, rfp_documents_dir)
                     
-                    processed_attachments.append(attachment_url)
-                except Exception as e:
-                    logger.error(f"Error processing RFP attachment {attachment_url}: {str(e)}")
-                    processed_attachments.append(attachment_url)
+                    processed_attachments = list(await asyncio.gather(*(relocate(url) for url in attachments)))
+                else:
+                    processed_attachments = list(attachments)
 
-        # Update activity: Running RFP agent
-        activity_tracker["current_step"] = "agent_processing"
-        activity_tracker["progress_percentage"] = 50
-        activity_tracker["message"] = "RFP Research Agent analyzing request and determining workflow..."
+            # Update activity: Running RFP agent
+            activity_tracker["current_step"] = "agent_processing"
+            activity_tracker["progress_percentage"] = 50
+            activity_tracker["message"] = "RFP Research Agent analyzing request and determining workflow..."
 
-        # Process with RFP agent
-        try:
-            events = await rfp_adk_service.run_agent(user_id, session_id, user_input, processed_attachments)
-            
-            # Analyze events to determine which sub-agents were called
-            agent_activities = analyze_agent_events(events)
-            
-            # Update activity tracker based on agent activities
-            for activity in agent_activities:
-                if "rfp_coordinator" in activity.lower():
-                    activity_tracker["steps"][1]["status"] = "completed"
-                    activity_tracker["steps"][2]["status"] = "in_progress"
-                    activity_tracker["progress_percentage"] = 60
-                    activity_tracker["message"] = "RFP Coordinator collecting project details..."
-                elif "teamcentre" in activity.lower():
-                    activity_tracker["steps"][2]["status"] = "completed"
-                    activity_tracker["steps"][3]["status"] = "in_progress"
-                    activity_tracker["progress_percentage"] = 70
-                    activity_tracker["message"] = "Creating opportunity structure in TeamCentre..."
-                elif "document_ingestion" in activity.lower():
-                    activity_tracker["steps"][3]["status"] = "completed"
-                    activity_tracker["steps"][4]["status"] = "in_progress"
-                    activity_tracker["progress_percentage"] = 85
-                    activity_tracker["message"] = "Processing and ingesting uploaded documents..."
-                elif "proposal_generator" in activity.lower():
-                    activity_tracker["steps"][4]["status"] = "completed"
-                    activity_tracker["progress_percentage"] = 95
-                    activity_tracker["message"] = "Generating comprehensive proposal document..."
-            
-            response_text = rfp_adk_service.extract_response_text(events)
-            
-            # Final activity update
-            activity_tracker["current_step"] = "completed"
-            activity_tracker["progress_percentage"] = 100
-            activity_tracker["message"] = "RFP Research Agent processing completed successfully!"
-            
-            # Save assistant response
-            message_service.add_message_to_conversation(
-                conversation_id=conversation_id,
-                role="assistant",
-                content=response_text
-            )
-            
-            return {
-                "response": response_text,
-                "session_id": session_id,
-                "conversation_id": conversation_id,
-                "agent_type": "rfp_research",
-                "activity_tracker": activity_tracker
-            }
-        except Exception as rfp_error:
-            logger.error(f"RFP agent error: {str(rfp_error)}")
-            error_message = f"RFP Agent Error: {str(rfp_error)}"
-            
-            # Update activity tracker for error
-            activity_tracker["current_step"] = "error"
-            activity_tracker["message"] = f"Error occurred: {str(rfp_error)}"
-            
-            message_service.add_message_to_conversation(
-                conversation_id=conversation_id,
-                role="assistant",
-                content=error_message
-            )
-            
-            return {
-                "response": error_message,
-                "session_id": session_id,
-                "conversation_id": conversation_id,
-                "error": True,
-                "activity_tracker": activity_tracker
-            }
+            # Process with RFP agent
+            try:
+                events = await rfp_adk_service.run_agent(user_id, session_id, user_input, processed_attachments)
+                
+                # Analyze events to determine which sub-agents were called
+                agent_activities = analyze_agent_events(events)
+                
+                # Update activity tracker based on the furthest sub-agent reached
+                apply_agent_stage(activity_tracker, agent_activities)
+                
+                response_text = rfp_adk_service.extract_response_text(events)
+                
+                # Final activity update
+                activity_tracker["current_step"] = "completed"
+                activity_tracker["progress_percentage"] = 100
+                activity_tracker["message"] = "RFP Research Agent processing completed successfully!"
+                
+                # Save the assistant response off the response path
+                _persist_in_background(conversation_id, "assistant", response_text)
+                
+                return {
+                    "response": response_text,
+                    "session_id": session_id,
+                    "conversation_id": conversation_id,
+                    "agent_type": "rfp_research",
+                    "activity_tracker": activity_tracker
+                }
+            except Exception as rfp_error:
+                logger.error(f"RFP agent error: {str(rfp_error)}")
+                error_message = f"RFP Agent Error: {str(rfp_error)}"
+                
+                # Update activity tracker for error
+                activity_tracker["current_step"] = "error"
+                activity_tracker["message"] = f"Error occurred: {str(rfp_error)}"
+                
+                _persist_in_background(conversation_id, "assistant", error_message)
+                
+                return {
+                    "response": error_message,
+                    "session_id": session_id,
+                    "conversation_id": conversation_id,
+                    "error": True,
+                    "activity_tracker": activity_tracker
+                }
+        
+        if not session_id:
+            # A new session can't be a resubmit of an earlier turn
+            return await handle_turn()
+        
+        # Identical submits (double-clicks, client retries) share one turn, stored once
+        response, replayed = await rfp_adk_service.run_turn_once(user_id, session_id, user_input, attachments, handle_turn)
+        if replayed:
+            logger.info(f"Replayed duplicate RFP chat submit for session {session_id}")
+        return response
             
     except Exception as e:
         logger.error(f"RFP Chat error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Server-sent event framing; proxies must not cache or buffer the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+SSE_PREFIX = b"data: "
+SSE_SUFFIX = b"\n\n"
+
+def _sse_frame(payload: dict) -> bytes:
+    """Encode one SSE data frame straight to bytes."""
+    return SSE_PREFIX + orjson.dumps(payload) + SSE_SUFFIX
+
 async def stream_rfp_response(user_id: str, session_id: str, conversation_id: str, user_input: str, attachments: list, activity_tracker: dict):
     """Stream RFP response with real-time events from ADK only."""
     try:
         response_text = ""
         
+        # Persist the user message up front so it survives a failed stream
+        if conversation_id:
+            await asyncio.to_thread(message_service.add_message_to_conversation, conversation_id, "user", user_input)
+        
         try:
             # Stream directly from ADK without any hardcoded steps
             async for event in rfp_adk_service.run_agent_streaming(user_id, session_id, user_input, True, attachments):
@@ -469,27 +629,27 @@ async def stream_rfp_response(user_id: str, session_id: str, conversation_id: st
                                     if text_chunk.strip():
                                         response_text += text_chunk
                                         # Send real content as thinking step
-                                        yield f"data: {json.dumps({'type': 'thinking', 'step': f'Agent: {text_chunk[:50]}...', 'progress': 50})}\n\n"
+                                        yield _sse_frame({'type': 'thinking', 'step': f'Agent: {text_chunk[:50]}...', 'progress': 50})
                     
                     # Handle tool usage events
                     elif "tool_call" in event or "function_call" in event:
                         tool_name = event.get("tool_call", {}).get("name", "research tool")
-                        yield f"data: {json.dumps({'type': 'thinking', 'step': f'Using {tool_name}', 'progress': 60})}\n\n"
+                        yield _sse_frame({'type': 'thinking', 'step': f'Using {tool_name}', 'progress': 60})
                     
                     # Handle agent state changes
                     elif "agent_state" in event:
                         state = event.get("agent_state", "")
-                        yield f"data: {json.dumps({'type': 'thinking', 'step': f'Agent state: {state}', 'progress': 70})}\n\n"
+                        yield _sse_frame({'type': 'thinking', 'step': f'Agent state: {state}', 'progress': 70})
                     
                     # Handle any other meaningful events
                     elif "message" in event:
                         message = str(event["message"])[:100]
-                        yield f"data: {json.dumps({'type': 'thinking', 'step': message, 'progress': 80})}\n\n"
+                        yield _sse_frame({'type': 'thinking', 'step': message, 'progress': 80})
                     
                     # Handle error events
                     elif "error" in event:
                         error_msg = str(event["error"])
-                        yield f"data: {json.dumps({'type': 'thinking', 'step': f'Handling: {error_msg}', 'progress': 40})}\n\n"
+                        yield _sse_frame({'type': 'thinking', 'step': f'Handling: {error_msg}', 'progress': 40})
             
             # If no response from streaming, fallback to regular call
             if not response_text.strip():
@@ -506,31 +666,28 @@ async def stream_rfp_response(user_id: str, session_id: str, conversation_id: st
         activity_tracker["status"] = "completed"
         activity_tracker["response"] = response_text
         
-        # Store conversation
-        if conversation_id:
-            conversation_data = {
-                "id": conversation_id,
-                "user_input": user_input,
-                "response": response_text,
-                "timestamp": datetime.now().isoformat(),
-                "attachments": attachments or []
-            }
-            await firestore_service.store_conversation(user_id, conversation_id, conversation_data)
-        
         # Send final response
-        yield f"data: {json.dumps({'type': 'response', 'content': response_text, 'session_id': session_id, 'conversation_id': conversation_id})}\n\n"
+        yield _sse_frame({'type': 'response', 'content': response_text, 'session_id': session_id, 'conversation_id': conversation_id})
+        
+        # Store assistant response once the client already has it
+        if conversation_id:
+            await asyncio.to_thread(message_service.batch_add_messages, conversation_id, [("assistant", response_text)])
         
     except Exception as e:
         logger.error(f"Streaming error: {e}")
         error_message = f"I encountered an error while processing your request: {str(e)}"
-        yield f"data: {json.dumps({'type': 'error', 'message': error_message})}\n\n"
+        yield _sse_frame({'type': 'error', 'message': error_message})
 
 
 if __name__ == "__main__":
     import uvicorn
+    reload = os.getenv("UVICORN_RELOAD", "false").lower() == "true"
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8080,
-        reload=True
+        loop="auto",  # uvloop when installed
+        http="auto",  # httptools when installed
+        workers=1 if reload else int(os.getenv("WEB_CONCURRENCY", "1")),
+        reload=reload
     )
\ No newline at end of file
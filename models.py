@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from enum import Enum
@@ -143,3 +143,9 @@ class ChatResponse(BaseModel):
     message_id: str
     processing_time_ms: int
     token_count: int
+
+# ==================== SERIALIZATION ADAPTERS ====================
+
+# Built once at import so list endpoints validate and dump JSON in pydantic-core
+MESSAGE_LIST_ADAPTER = TypeAdapter(List[MessageResponse])
+CONVERSATION_LIST_ADAPTER = TypeAdapter(List[ConversationResponse])
@@ -4,73 +4,393 @@ Simple Cloud Storage + Firestore hybrid with local fallback
 """
 
 import os
-import json
-from datetime import datetime
+import orjson
+import asyncio
+import time
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import OrderedDict
+from itertools import islice
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, Optional
 import uuid
+import gzip
+import tempfile
+import hashlib
+import functools
 import logging
 
+from config import COLLECTIONS, GCS_CONFIG, PRODUCTION_STORAGE
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+def _utf8_encode(content: str) -> tuple:
+    """Return (encoded bytes or None, UTF-8 size); ASCII text is measured without encoding."""
+    if content.isascii():
+        return None, len(content)
+    raw = content.encode('utf-8')
+    return raw, len(raw)
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _iso_to_ns(timestamp: str) -> int:
+    """Nanoseconds since the epoch for an ISO timestamp (naive values are UTC)."""
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - _EPOCH) // timedelta(microseconds=1) * 1000
+
+def _ns_to_iso(ts_ns: int) -> str:
+    """Naive-UTC ISO string for display, matching what older versions stored."""
+    return (_EPOCH + timedelta(microseconds=ts_ns // 1000)).isoformat()
+
+def _json_default(obj):
+    """orjson fallback: datetimes as ISO strings.
+    
+    orjson refuses datetime subclasses such as Firestore's DatetimeWithNanoseconds,
+    so every datetime is routed here via OPT_PASSTHROUGH_DATETIME.
+    """
+    if isinstance(obj, datetime):
+        return datetime.isoformat(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def _dumps_docs(obj) -> bytes:
+    """Serialize Firestore documents, whose timestamps may be DatetimeWithNanoseconds."""
+    return orjson.dumps(obj, default=_json_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+class ReadCache:
+    """Thread-safe LRU cache with per-entry TTL for repeated storage reads."""
+    
+    def __init__(self, maxsize: int = 4096, ttl: float = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidate(); see generation()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def generation(self) -> int:
+        """Token to take before reading storage; pass it to set() so a read that raced
+        a write (and its invalidate) is not cached."""
+        return self._generation
+    
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def set(self, key: tuple, value, generation: int = None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, owner: str = None):
+        """Drop entries whose key starts with `owner`, or everything when omitted."""
+        with self._lock:
+            self._generation += 1
+            if owner is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == owner]:
+                del self._entries[key]
+    
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+class ContentCache:
+    """Thread-safe LRU of immutable message bodies, bounded by total characters."""
+    
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: str, value: str):
+        if len(value) > self.max_chars:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+    
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "chars": self.size, "hits": self.hits, "misses": self.misses}
+
 # Local fallback storage
 class LocalStorage:
     """Local file-based storage for development without Firestore."""
     
-    def __init__(self, storage_dir: str = "./local_storage"):
+    def __init__(self, storage_dir: str = "./local_storage", size_threshold: int = 500_000):
         self.storage_dir = storage_dir
+        self.size_threshold = size_threshold
         os.makedirs(f"{storage_dir}/messages", exist_ok=True)
         os.makedirs(f"{storage_dir}/conversations", exist_ok=True)
         os.makedirs(f"{storage_dir}/documents", exist_ok=True)
+        
+        # Messages live in one indexed SQLite table; handlers run in threadpool workers
+        self._db_lock = threading.Lock()
+        self._conv_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._spill_day = None
+        self._spill_fd = None
+        self._spill_path = None
+        self._db = sqlite3.connect(f"{storage_dir}/messages.db", isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id TEXT PRIMARY KEY, conversation_id TEXT NOT NULL, role TEXT NOT NULL, ts_ns INTEGER NOT NULL, "
+            "content TEXT, content_path TEXT, metadata TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_messages_conv_ts_ns ON messages(conversation_id, ts_ns)")
+        self._import_json_messages()
+        self._index_conversations()
+        
+        # Overlaps the many small file reads behind a listing
+        self._io_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="local-io")
     
-    def store_message(self, conversation_id: str, role: str, content: str, metadata: Dict = None) -> str:
-        message_id = f"msg_{uuid.uuid4().hex[:12]}"
-        message_data = {
-            "id": message_id,
-            "conversation_id": conversation_id,
-            "role": role,
-            "content": content,
-            "timestamp": datetime.utcnow().isoformat(),
-            "metadata": metadata or {}
-        }
+    def _import_json_messages(self):
+        """One-time import of messages written as per-message JSON files by older versions."""
+        message_dir = f"{self.storage_dir}/messages"
+        if self._db.execute("SELECT 1 FROM messages LIMIT 1").fetchone():
+            return
         
-        with open(f"{self.storage_dir}/messages/{message_id}.json", "w") as f:
-            json.dump(message_data, f, indent=2)
+        rows = []
+        with os.scandir(message_dir) as entries:
+            paths = [entry.path for entry in entries if entry.name.endswith('.json')]
+        for path in paths:
+            try:
+                with open(path, "rb") as f:
+                    data = orjson.loads(f.read())
+                rows.append((data["id"], data["conversation_id"], data["role"], _iso_to_ns(data["timestamp"]),
+                             data["content"], None, orjson.dumps(data.get("metadata", {})).decode()))
+            except Exception:
+                continue
         
-        return message_id
+        if rows:
+            with self._db_lock:
+                self._db.execute("BEGIN")
+                self._db.executemany("INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self._db.execute("COMMIT")
+            logger.info(f"Imported {len(rows)} JSON messages into {self.storage_dir}/messages.db")
     
-    def get_message_content(self, message_id: str) -> Optional[str]:
+    def _index_conversation(self, user_id: str, conversation_id: str):
+        """Record the conversation as an empty marker file under its owner's index directory."""
+        user_dir = f"{self.storage_dir}/conversations/by_user/{user_id}"
+        os.makedirs(user_dir, exist_ok=True)
+        open(f"{user_dir}/{conversation_id}", "wb").close()
+    
+    def _index_conversations(self):
+        """One-time build of the per-user index for conversations written by older versions."""
+        conv_dir = f"{self.storage_dir}/conversations"
+        done_marker = f"{conv_dir}/by_user/.indexed"
+        if os.path.exists(done_marker):
+            return
+        
+        with os.scandir(conv_dir) as entries:
+            paths = [entry.path for entry in entries if entry.name.endswith('.json') and entry.is_file()]
+        for path in paths:
+            try:
+                with open(path, "rb") as f:
+                    data = orjson.loads(f.read())
+                self._index_conversation(data["user_id"], data["id"])
+            except Exception:
+                continue
+        
+        os.makedirs(f"{conv_dir}/by_user", exist_ok=True)
+        open(done_marker, "wb").close()
+    
+    def _message_row(self, conversation_id: str, role: str, content: str, metadata: Dict, ts_ns: int,
+                     message_id: str = None) -> tuple:
+        message_id = message_id or f"msg_{uuid.uuid4().hex[:12]}"
+        content_path = None
+        raw, content_size = _utf8_encode(content)
+        if content_size > self.size_threshold:
+            # Spill large content to the day's append-only log and keep only its location inline
+            content_path = self._append_spill(content.encode('utf-8') if raw is None else raw)
+            content = None
+        return (message_id, conversation_id, role, ts_ns, content, content_path, orjson.dumps(metadata or {}).decode())
+    
+    def _append_spill(self, data: bytes) -> str:
+        """Append content to today's spill log with one write; returns "<log path>#<offset>+<length>"."""
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        with self._spill_lock:
+            if self._spill_day != day:
+                # One open per day; O_APPEND writes need no directory update
+                if self._spill_fd is not None:
+                    os.close(self._spill_fd)
+                self._spill_path = f"{self.storage_dir}/messages/{day}.log"
+                self._spill_fd = os.open(self._spill_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+                self._spill_day = day
+            
+            # flock keeps the offset/write pair atomic across worker processes
+            if fcntl:
+                fcntl.flock(self._spill_fd, fcntl.LOCK_EX)
+            try:
+                offset = os.lseek(self._spill_fd, 0, os.SEEK_END)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self._spill_fd, view):]
+            finally:
+                if fcntl:
+                    fcntl.flock(self._spill_fd, fcntl.LOCK_UN)
+            return f"{self._spill_path}#{offset}+{len(data)}"
+    
+    def _read_spill(self, content_path: str) -> Optional[bytes]:
+        """Read spilled content from a spill log slice, or a per-message file from older versions."""
+        path, _, span = content_path.rpartition("#")
+        offset, _, length = span.partition("+")
+        if not (path and offset.isdigit() and length.isdigit()):
+            return self._read_file(content_path)
         try:
-            with open(f"{self.storage_dir}/messages/{message_id}.json", "r") as f:
-                data = json.load(f)
-                return data.get("content", "")
+            with open(path, "rb") as f:
+                f.seek(int(offset))
+                return f.read(int(length))
         except FileNotFoundError:
             return None
     
-    def get_conversation_messages(self, conversation_id: str) -> list:
-        messages = []
-        message_dir = f"{self.storage_dir}/messages"
+    def store_message(self, conversation_id: str, role: str, content: str, metadata: Dict = None, message_id: str = None) -> str:
+        row = self._message_row(conversation_id, role, content, metadata, time.time_ns(), message_id)
+        with self._db_lock:
+            self._db.execute("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+        self._bump_conversation(conversation_id, 1, _ns_to_iso(row[3]))
+        return row[0]
+    
+    def store_messages(self, conversation_id: str, messages: list, metadata: Dict = None) -> list:
+        # Offset by a microsecond each so ordering matches list order and survives ISO formatting
+        now_ns = time.time_ns()
+        rows = [
+            self._message_row(conversation_id, role, content, metadata, now_ns + i * 1000)
+            for i, (role, content) in enumerate(messages)
+        ]
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+        if rows:
+            self._bump_conversation(conversation_id, len(rows), _ns_to_iso(rows[-1][3]))
+        return [row[0] for row in rows]
+    
+    def _bump_conversation(self, conversation_id: str, added: int, last_message_ts: str):
+        """Keep message_count/last_message_ts current in the conversation file."""
+        conv_file = f"{self.storage_dir}/conversations/{conversation_id}.json"
+        try:
+            with self._conv_lock, open(conv_file, "r+b") as f:
+                # flock also serializes against other worker processes
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                data = orjson.loads(f.read())
+                data["message_count"] = data.get("message_count", 0) + added
+                data["last_message_ts"] = last_message_ts
+                data["updated_at"] = last_message_ts
+                f.seek(0)
+                f.write(orjson.dumps(data))
+                f.truncate()
+        except FileNotFoundError:
+            pass
+    
+    @staticmethod
+    def _read_file(path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    
+    def _read_files(self, paths: list, reader=None) -> list:
+        """Read several files, in parallel when there is more than one; None for missing files."""
+        reader = reader or self._read_file
+        if len(paths) < 2:
+            return [reader(path) for path in paths]
+        return list(self._io_pool.map(reader, paths))
+    
+    def _read_content(self, content: Optional[str], content_path: Optional[str]) -> Optional[str]:
+        if content_path is None:
+            return content
+        raw = self._read_spill(content_path)
+        return None if raw is None else raw.decode('utf-8')
+    
+    def get_message_content(self, message_id: str) -> Optional[str]:
+        with self._db_lock:
+            row = self._db.execute("SELECT content, content_path FROM messages WHERE id = ?", (message_id,)).fetchone()
+        if row is None:
+            return None
+        return self._read_content(*row)
+    
+    def get_conversation_messages(self, conversation_id: str, limit: int = None, before_timestamp: str = None) -> list:
+        query = "SELECT id, role, ts_ns, content, content_path, metadata FROM messages WHERE conversation_id = ?"
+        params = [conversation_id]
+        if before_timestamp:
+            query += " AND ts_ns < ?"
+            params.append(_iso_to_ns(before_timestamp))
+        if limit is not None:
+            # Newest page before the cursor, restored to chronological order below
+            query += " ORDER BY ts_ns DESC LIMIT ?"
+            params.append(limit)
+        else:
+            query += " ORDER BY ts_ns"
         
-        if not os.path.exists(message_dir):
-            return messages
+        with self._db_lock:
+            rows = self._db.execute(query, params).fetchall()
+        if limit is not None:
+            rows.reverse()
         
-        for filename in os.listdir(message_dir):
-            if filename.endswith('.json'):
-                try:
-                    with open(f"{message_dir}/{filename}", "r") as f:
-                        data = json.load(f)
-                        if data.get("conversation_id") == conversation_id:
-                            messages.append({
-                                "role": data["role"],
-                                "content": data["content"],
-                                "timestamp": data["timestamp"],
-                                "attachments": data.get("metadata", {}).get("attachments", [])
-                            })
-                except:
-                    continue
+        # Load spilled large messages together rather than one after another
+        spill_paths = [row[4] for row in rows if row[4] is not None]
+        spilled = {
+            path: None if raw is None else raw.decode('utf-8')
+            for path, raw in zip(spill_paths, self._read_files(spill_paths, self._read_spill))
+        }
         
-        # Sort by timestamp
-        messages.sort(key=lambda x: x["timestamp"])
-        return messages
+        return [
+            {
+                "id": message_id,
+                "conversation_id": conversation_id,
+                "role": role,
+                "content": content if content_path is None else spilled[content_path],
+                "timestamp": _ns_to_iso(ts_ns),
+                "attachments": orjson.loads(metadata).get("attachments", [])
+            }
+            for message_id, role, ts_ns, content, content_path, metadata in rows
+        ]
     
     def create_conversation(self, conversation_id: str, user_id: str, title: str) -> dict:
         """Create a new conversation."""
@@ -83,8 +403,9 @@ class LocalStorage:
             "message_count": 0
         }
         
-        with open(f"{self.storage_dir}/conversations/{conversation_id}.json", "w") as f:
-            json.dump(conversation_data, f, indent=2)
+        with open(f"{self.storage_dir}/conversations/{conversation_id}.json", "wb") as f:
+            f.write(orjson.dumps(conversation_data))
+        self._index_conversation(user_id, conversation_id)
         
         return {
             "id": conversation_id,
@@ -97,23 +418,26 @@ class LocalStorage:
         conversations = []
         conv_dir = f"{self.storage_dir}/conversations"
         
-        if not os.path.exists(conv_dir):
+        # Only open this user's conversations, found via the by_user index
+        try:
+            with os.scandir(f"{conv_dir}/by_user/{user_id}") as entries:
+                conversation_ids = [entry.name for entry in entries]
+        except FileNotFoundError:
             return conversations
         
-        for filename in os.listdir(conv_dir):
-            if filename.endswith('.json'):
-                try:
-                    with open(f"{conv_dir}/{filename}", "r") as f:
-                        data = json.load(f)
-                        if data.get("user_id") == user_id:
-                            conversations.append({
-                                "id": data["id"],
-                                "title": data["title"],
-                                "created_at": data["created_at"],
-                                "message_count": data.get("message_count", 0)
-                            })
-                except:
-                    continue
+        raw_files = self._read_files([f"{conv_dir}/{conversation_id}.json" for conversation_id in conversation_ids])
+        for raw in raw_files:
+            try:
+                data = orjson.loads(raw)
+                if data.get("user_id") == user_id:
+                    conversations.append({
+                        "id": data["id"],
+                        "title": data["title"],
+                        "created_at": data["created_at"],
+                        "message_count": data.get("message_count", 0)
+                    })
+            except:
+                continue
         
         # Sort by created_at descending
         conversations.sort(key=lambda x: x["created_at"], reverse=True)
@@ -127,14 +451,15 @@ class LocalStorage:
             return False
         
         try:
-            with open(conv_file, "r") as f:
-                data = json.load(f)
-            
-            data["title"] = title
-            data["updated_at"] = datetime.utcnow().isoformat()
-            
-            with open(conv_file, "w") as f:
-                json.dump(data, f, indent=2)
+            with self._conv_lock:
+                with open(conv_file, "rb") as f:
+                    data = orjson.loads(f.read())
+                
+                data["title"] = title
+                data["updated_at"] = datetime.utcnow().isoformat()
+                
+                with open(conv_file, "wb") as f:
+                    f.write(orjson.dumps(data))
             
             return True
         except Exception:
@@ -143,77 +468,454 @@ class LocalStorage:
 try:
     from google.cloud import storage
     from google.cloud import firestore
+    from google.cloud.storage import transfer_manager
+    from google.api_core.exceptions import NotFound, PreconditionFailed
     CLOUD_AVAILABLE = True
 except ImportError:
     CLOUD_AVAILABLE = False
 
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Message bodies above this many bytes are downloaded as parallel range requests
+CHUNKED_DOWNLOAD_THRESHOLD = 4 * 1024 * 1024
+
+class FirestoreWriteCoalescer:
+    """Group-commits document writes from concurrent callers into shared WriteBatches.
+    
+    A single writer thread drains everything queued while the previous commit was
+    in flight, so an idle server commits immediately and a busy one sends up to
+    `max_batch` documents per RPC. A submission is never split across batches.
+    """
+    
+    def __init__(self, firestore_client, max_batch: int = 100):
+        self.firestore_client = firestore_client
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="firestore-writer", daemon=True)
+        self._thread.start()
+    
+    def submit(self, writes: list) -> Future:
+        """Queue (doc_ref, doc, merge) set()s that commit together; the Future resolves once their batch commits."""
+        future = Future()
+        self._queue.put((writes, future))
+        return future
+    
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            while size < self.max_batch:
+                try:
+                    pending.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                size += len(pending[-1][0])
+            
+            # Building the batch can raise too (e.g. unserializable metadata); fail only this
+            # batch's callers and keep the writer thread alive
+            try:
+                batch = self.firestore_client.batch()
+                for writes, _ in pending:
+                    for doc_ref, doc, merge in writes:
+                        batch.set(doc_ref, doc, merge=merge)
+                batch.commit()
+            except Exception as e:
+                logger.error(f"Coalesced Firestore commit of {len(pending)} writes failed: {e}")
+                for _, future in pending:
+                    future.set_exception(e)
+            else:
+                for _, future in pending:
+                    future.set_result(None)
+
+# Seconds a writer waits for its coalesced Firestore commit
+FIRESTORE_WRITE_TIMEOUT = 60
+
+@functools.lru_cache(maxsize=8)
+def _storage_client(project_id: str):
+    """Process-wide storage.Client per project, with a connection pool sized for the I/O pool."""
+    from requests.adapters import HTTPAdapter
+    client = storage.Client(project=project_id)
+    client._http.mount("https://", HTTPAdapter(
+        pool_connections=GCS_CONFIG["http_pool_connections"],
+        pool_maxsize=max(GCS_CONFIG["http_pool_maxsize"], PRODUCTION_STORAGE["gcs_parallelism"])
+    ))
+    return client
+
+@functools.lru_cache(maxsize=8)
+def _firestore_client(project_id: str):
+    """Process-wide firestore.Client per project, so the gRPC channel and credentials are shared."""
+    return firestore.Client(project=project_id)
+
 class ProductionStorage:
     """Simple production storage: Small data in Firestore, large content in Cloud Storage."""
     
     def __init__(self, project_id: str, bucket_name: str):
         self.project_id = project_id
         self.bucket_name = bucket_name
-        self.storage_client = storage.Client(project=project_id)
-        self.firestore_client = firestore.Client(project=project_id)
+        self.storage_client = _storage_client(project_id)
+        self.firestore_client = _firestore_client(project_id)
         self.bucket = self.storage_client.bucket(bucket_name)
+        self.message_writer = FirestoreWriteCoalescer(self.firestore_client)
+        self._async_firestore_client = None
+        
+        # Shared pool so blob uploads/downloads for several messages run concurrently
+        self.io_pool = ThreadPoolExecutor(max_workers=PRODUCTION_STORAGE["gcs_parallelism"], thread_name_prefix="gcs-io")
+        
+        # Blob-stored bodies keyed by content_url; messages are immutable once written,
+        # so cached bodies never need invalidating
+        self.content_cache = ContentCache(PRODUCTION_STORAGE["content_cache_chars"])
+        
+        # Optional per-conversation JSONL log blob so full-history reads are one GET
+        self.conversation_log = PRODUCTION_STORAGE["conversation_log"]
+        # Optional gzip blob of the ready-to-serve message list per conversation
+        self.message_cache_blob = PRODUCTION_STORAGE["message_cache_blob"]
         
         # Size threshold: anything over 500KB goes to Cloud Storage
         self.size_threshold = 500_000  # 500KB
     
-    def store_message(self, conversation_id: str, role: str, content: str, metadata: Dict = None) -> str:
-        """Store message with automatic storage decision."""
-        message_id = f"msg_{uuid.uuid4().hex[:12]}"
-        content_size = len(content.encode('utf-8'))
+    def _build_message_doc(self, conversation_id: str, role: str, content: str, metadata: Dict, timestamp: datetime,
+                           message_id: str = None) -> tuple:
+        """Build a message document, starting the Cloud Storage upload for large content.
+        
+        Returns the document and the upload Future (None when content stays inline).
+        """
+        message_id = message_id or f"msg_{uuid.uuid4().hex[:12]}"
+        raw, content_size = _utf8_encode(content)
         
         message_doc = {
             "id": message_id,
             "conversation_id": conversation_id,
             "role": role,
-            "timestamp": datetime.utcnow(),
+            "timestamp": timestamp,
             "content_size": content_size,
             "metadata": metadata or {}
         }
         
+        upload = None
         if content_size <= self.size_threshold:
             # Store directly in Firestore
             message_doc["content"] = content
             message_doc["storage_type"] = "firestore"
         else:
-            # Store in Cloud Storage
-            storage_path = f"messages/{conversation_id}/{message_id}.txt"
-            blob = self.bucket.blob(storage_path)
-            blob.upload_from_string(content, content_type='text/plain')
+            # Store in Cloud Storage on the I/O pool, reusing the bytes from the size check.
+            # Date-partitioned so cleanup only lists the expired days
+            storage_path = f"messages/{timestamp:%Y/%m/%d}/{conversation_id}/{message_id}.txt"
+            raw = content.encode('utf-8') if raw is None else raw
+            content_hash = hashlib.sha256(raw).hexdigest()
+            upload = self.io_pool.submit(self._upload_content, storage_path, raw, content_hash)
             
+            # _apply_upload waits for the content to land before the document references it
             message_doc["content_url"] = f"gs://{self.bucket_name}/{storage_path}"
+            message_doc["storage_path"] = storage_path
+            message_doc["content_hash"] = content_hash
             message_doc["storage_type"] = "cloud_storage"
+            if ZSTD_AVAILABLE:
+                message_doc["compression"] = "zstd"
             message_doc["content_preview"] = content[:200] + "..." if len(content) > 200 else content
         
-        # Store message document in Firestore
-        from config import COLLECTIONS
-        self.firestore_client.collection(COLLECTIONS["messages"]).document(message_id).set(message_doc)
-        return message_id
+        return message_doc, upload
+    
+    def store_message(self, conversation_id: str, role: str, content: str, metadata: Dict = None, message_id: str = None) -> str:
+        """Store message with automatic storage decision."""
+        message_doc, upload = self._build_message_doc(conversation_id, role, content, metadata, datetime.utcnow(), message_id)
+        if upload:
+            # The document must not reference content that failed to upload
+            self._apply_upload(message_doc, upload)
+        
+        # Store message document and bump the conversation counters in one commit,
+        # shared with concurrent writers. Waiting keeps later reads consistent.
+        doc_ref = self.firestore_client.collection(COLLECTIONS["messages"]).document(message_doc["id"])
+        self.message_writer.submit([
+            (doc_ref, message_doc, False),
+            self._conversation_counter_write(conversation_id, 1, message_doc["timestamp"]),
+        ]).result(timeout=FIRESTORE_WRITE_TIMEOUT)
+        if self.conversation_log:
+            self._append_conversation_log_safely(conversation_id, [message_doc])
+        return message_doc["id"]
+    
+    def store_messages(self, conversation_id: str, messages: list, metadata: Dict = None) -> list:
+        """Store several (role, content) messages in one Firestore commit, shared with concurrent writers."""
+        collection = self.firestore_client.collection(COLLECTIONS["messages"])
+        now = datetime.utcnow()
+        
+        # Offset by a microsecond each so timestamp ordering matches list order;
+        # large-content uploads for all messages run in parallel
+        built = [
+            self._build_message_doc(conversation_id, role, content, metadata, now + timedelta(microseconds=i))
+            for i, (role, content) in enumerate(messages)
+        ]
+        
+        writes = []
+        for message_doc, upload in built:
+            if upload:
+                self._apply_upload(message_doc, upload)
+            writes.append((collection.document(message_doc["id"]), message_doc, False))
+        
+        if not built:
+            return []
+        writes.append(self._conversation_counter_write(conversation_id, len(built), built[-1][0]["timestamp"]))
+        self.message_writer.submit(writes).result(timeout=FIRESTORE_WRITE_TIMEOUT)
+        if self.conversation_log:
+            self._append_conversation_log_safely(conversation_id, [message_doc for message_doc, _ in built])
+        return [message_doc["id"] for message_doc, _ in built]
+    
+    def _conversation_counter_write(self, conversation_id: str, added: int, last_message_ts: datetime) -> tuple:
+        """(doc_ref, doc, merge) keeping message_count/last_message_ts current on the conversation."""
+        doc_ref = self.firestore_client.collection(COLLECTIONS["conversations"]).document(conversation_id)
+        return (doc_ref, {
+            "message_count": firestore.Increment(added),
+            "last_message_ts": last_message_ts,
+            "updated_at": firestore.SERVER_TIMESTAMP
+        }, True)
+    
+    @staticmethod
+    def _log_lines(docs: list) -> bytes:
+        lines = []
+        for doc in docs:
+            timestamp = doc["timestamp"]
+            if timestamp.tzinfo is not None:
+                # Firestore returns aware UTC datetimes; keep the log uniformly naive UTC
+                doc = {**doc, "timestamp": timestamp.replace(tzinfo=None)}
+            lines.append(_dumps_docs(doc))
+        return b"\n".join(lines) + b"\n"
+    
+    def _append_conversation_log_safely(self, conversation_id: str, docs: list):
+        """Best-effort log append; the messages are already committed to Firestore."""
+        try:
+            self.append_conversation_log(conversation_id, docs)
+        except Exception as e:
+            logger.error(f"Appending to conversation log {conversation_id} failed: {e}")
+            # A log missing messages must not be served; readers fall back to Firestore
+            try:
+                self.bucket.blob(f"conversations/{conversation_id}.jsonl").delete()
+            except Exception:
+                pass
+    
+    def append_conversation_log(self, conversation_id: str, docs: list):
+        """Append message documents to conversations/{id}.jsonl with a staged upload + compose."""
+        log = self.bucket.blob(f"conversations/{conversation_id}.jsonl")
+        
+        for _ in range(5):
+            try:
+                log.reload()
+            except NotFound:
+                # First append: seed from Firestore, which already holds these docs
+                query = self.firestore_client.collection(COLLECTIONS["messages"])\
+                            .where("conversation_id", "==", conversation_id).order_by("timestamp")
+                history = [doc.to_dict() for doc in query.stream()]
+                try:
+                    log.upload_from_string(self._log_lines(history), content_type="application/x-ndjson", if_generation_match=0)
+                    return
+                except PreconditionFailed:
+                    continue
+            
+            try:
+                if (log.component_count or 0) >= 1000:
+                    # Composite objects cap at 1024 components; re-upload to flatten
+                    log.upload_from_string(
+                        log.download_as_bytes() + self._log_lines(docs),
+                        content_type="application/x-ndjson", if_generation_match=log.generation
+                    )
+                    return
+                
+                staging = self.bucket.blob(f"stage/{conversation_id}/{uuid.uuid4().hex}")
+                staging.upload_from_string(self._log_lines(docs), content_type="application/x-ndjson")
+                try:
+                    log.compose([log, staging], if_generation_match=log.generation)
+                finally:
+                    staging.delete()
+                return
+            except PreconditionFailed:
+                # Another writer appended first; retry against the new generation
+                continue
+        
+        logger.warning(f"Gave up appending to conversation log {conversation_id} after repeated contention")
+        # A log missing messages must not be served; readers fall back to Firestore
+        try:
+            log.delete()
+        except NotFound:
+            pass
+    
+    def _message_cache_blob(self, conversation_id: str):
+        return self.bucket.blob(f"conversations/{conversation_id}.messages.json.gz")
+    
+    def conversation_message_count(self, conversation_id: str) -> Optional[int]:
+        """The conversation's message_count counter, or None if it has no document."""
+        doc = self.firestore_client.collection(COLLECTIONS["conversations"]).document(conversation_id).get(
+            ["message_count"]
+        )
+        return doc.to_dict().get("message_count", 0) if doc.exists else None
+    
+    def write_message_cache_blob(self, conversation_id: str, messages: list, message_count: int):
+        """Publish a rebuilt message list, stamped with the message_count it was built at."""
+        blob = self._message_cache_blob(conversation_id)
+        blob.content_encoding = "gzip"
+        blob.upload_from_string(
+            gzip.compress(_dumps_docs({"message_count": message_count, "messages": messages})),
+            content_type="application/json"
+        )
+    
+    def read_message_cache_blob(self, conversation_id: str, message_count: int) -> Optional[list]:
+        """Cached message list, or None when missing or built before the latest write.
+        
+        Writes never touch the blob: message_count moves in the same commit as every
+        message, so a blob stamped with an older count is simply stale.
+        """
+        try:
+            data = self._message_cache_blob(conversation_id).download_as_bytes(raw_download=True)
+        except NotFound:
+            return None
+        cached = orjson.loads(gzip.decompress(data))
+        if not isinstance(cached, dict) or cached.get("message_count") != message_count:
+            return None
+        messages = cached["messages"]
+        # Timestamps were stored as aware ISO strings; return datetimes like the Firestore path
+        for message in messages:
+            message["timestamp"] = datetime.fromisoformat(message["timestamp"])
+        return messages
+    
+    def read_conversation_log(self, conversation_id: str) -> Optional[list]:
+        """Full message history from the log blob, or None when the conversation has no log."""
+        try:
+            data = self.bucket.blob(f"conversations/{conversation_id}.jsonl").download_as_bytes()
+        except NotFound:
+            return None
+        # A writer racing the initial seed can append a message the seed already holds
+        docs = {}
+        for line in data.splitlines():
+            if line:
+                doc = orjson.loads(line)
+                docs.setdefault(doc["id"], doc)
+        for doc in docs.values():
+            doc["timestamp"] = datetime.fromisoformat(doc["timestamp"])
+        return list(docs.values())
     
     def get_message_content(self, message_id: str) -> Optional[str]:
         """Retrieve message content from appropriate storage."""
-        from config import COLLECTIONS
-        doc = self.firestore_client.collection(COLLECTIONS["messages"]).document(message_id).get()
+        doc = self.firestore_client.collection(COLLECTIONS["messages"]).document(message_id).get(
+            field_paths=["content", "storage_type", "content_url", "content_size"]
+        )
         if not doc.exists:
             return None
         
         data = doc.to_dict()
         
+        content = None
         if data.get("storage_type") == "firestore":
-            return data.get("content", "")
-        
+            content = data.get("content", "")
         elif data.get("storage_type") == "cloud_storage":
-            content_url = data.get("content_url", "")
-            if content_url.startswith("gs://"):
-                # Extract blob path from gs:// URL
-                blob_path = content_url.replace(f"gs://{self.bucket_name}/", "")
-                blob = self.bucket.blob(blob_path)
-                return blob.download_as_text()
+            content = self.download_content(data.get("content_url", ""), data.get("content_size", 0))
+        
+        return content
+    
+    def get_message_range(self, message_id: str, start: int, end: int) -> Optional[str]:
+        """Bytes start..end (inclusive) of a message's UTF-8 content, fetched with an HTTP Range request."""
+        doc = self.firestore_client.collection(COLLECTIONS["messages"]).document(message_id).get(
+            field_paths=["content", "storage_type", "content_url"]
+        )
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        
+        if data.get("storage_type") == "firestore":
+            return data.get("content", "").encode('utf-8')[start:end + 1].decode('utf-8', errors='replace')
+        
+        content_url = data.get("content_url", "")
+        if not content_url.startswith("gs://"):
+            return None
+        cached = self.content_cache.get(content_url)
+        if cached is not None:
+            return cached.encode('utf-8')[start:end + 1].decode('utf-8', errors='replace')
+        blob = self.bucket.get_blob(content_url.replace(f"gs://{self.bucket_name}/", ""))
+        if blob is None:
+            return None
+        if blob.content_encoding == "zstd":
+            # Compressed offsets don't map to text offsets; fetch (or reuse) the whole body
+            return self.download_content(content_url).encode('utf-8')[start:end + 1].decode('utf-8', errors='replace')
+        raw = blob.download_as_bytes(start=start, end=end, raw_download=True)
+        return raw.decode('utf-8', errors='replace')
+    
+    def _upload_content(self, storage_path: str, data: bytes, content_hash: str) -> str:
+        """Upload UTF-8 message content, or copy it server-side when identical content is already stored.
+        
+        Returns the storage path holding the content.
+        """
+        hash_ref = self.firestore_client.collection(COLLECTIONS["content_hashes"]).document(content_hash)
+        existing = hash_ref.get()
+        if existing.exists:
+            # Copy under the new message's date prefix so cleanup_old_content keeps it for
+            # the full retention period; the bytes never pass through this process
+            try:
+                self.bucket.copy_blob(self.bucket.blob(existing.to_dict()["storage_path"]), self.bucket, storage_path)
+            except NotFound:
+                pass  # Source already cleaned up; upload afresh
+            else:
+                hash_ref.set({"storage_path": storage_path, "created_at": datetime.utcnow()})
+                return storage_path
+        
+        blob = self.bucket.blob(storage_path)
+        if ZSTD_AVAILABLE:
+            data = zstandard.ZstdCompressor(level=3).compress(data)
+            blob.content_encoding = "zstd"
+        blob.upload_from_string(data, content_type='text/plain; charset=utf-8')
+        hash_ref.set({"storage_path": storage_path, "created_at": datetime.utcnow()})
+        return storage_path
+    
+    def _apply_upload(self, message_doc: dict, upload: Future):
+        """Wait for a content upload and point the document at wherever the content lives."""
+        storage_path = upload.result()
+        message_doc["storage_path"] = storage_path
+        message_doc["content_url"] = f"gs://{self.bucket_name}/{storage_path}"
+    
+    @property
+    def async_firestore_client(self):
+        """Firestore AsyncClient, created on first use so it binds to the serving event loop."""
+        if self._async_firestore_client is None:
+            self._async_firestore_client = firestore.AsyncClient(project=self.project_id)
+        return self._async_firestore_client
+    
+    def download_content(self, content_url: str, content_size: int = 0) -> Optional[str]:
+        """Download message content referenced by a gs:// URL.
         
-        return None
+        Content larger than CHUNKED_DOWNLOAD_THRESHOLD is fetched as parallel ranged reads.
+        """
+        if not content_url.startswith("gs://"):
+            return None
+        content = self.content_cache.get(content_url)
+        if content is not None:
+            return content
+        # Extract blob path from gs:// URL
+        blob_path = content_url.replace(f"gs://{self.bucket_name}/", "")
+        blob = self.bucket.blob(blob_path)
+        # Raw download so the HTTP stack never tries to decode content-encoding itself
+        if content_size > CHUNKED_DOWNLOAD_THRESHOLD:
+            data = self._download_chunked(blob)
+        else:
+            data = blob.download_as_bytes(raw_download=True)
+        if data[:4] == ZSTD_MAGIC:
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError(f"{content_url} is zstd-compressed but zstandard is not installed")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        content = data.decode('utf-8')
+        self.content_cache.set(content_url, content)
+        return content
+    
+    def _download_chunked(self, blob) -> bytes:
+        """Download a large blob as concurrent 8 MiB range requests."""
+        if blob.size is None:
+            blob.reload()
+        with tempfile.NamedTemporaryFile() as f:
+            transfer_manager.download_chunks_concurrently(
+                blob, f.name, chunk_size=8 << 20, max_workers=8,
+                worker_type=transfer_manager.THREAD, download_kwargs={"raw_download": True}
+            )
+            return f.read()
     
     def store_document_request(self, user_id: str, document_type: str, content: str, metadata: Dict = None) -> str:
         """Store document generation request."""
@@ -222,39 +924,77 @@ class ProductionStorage:
         # Always store large documents in Cloud Storage
         storage_path = f"documents/{user_id}/{request_id}.txt"
         blob = self.bucket.blob(storage_path)
-        blob.upload_from_string(content, content_type='text/plain')
+        raw, content_size = _utf8_encode(content)
+        blob.upload_from_string(content if raw is None else raw, content_type='text/plain; charset=utf-8')
         
         doc_request = {
             "request_id": request_id,
             "user_id": user_id,
             "document_type": document_type,
             "content_url": f"gs://{self.bucket_name}/{storage_path}",
-            "content_size": len(content.encode('utf-8')),
+            "content_size": content_size,
             "status": "completed",
             "created_at": datetime.utcnow(),
             "metadata": metadata or {}
         }
         
-        from config import COLLECTIONS
         self.firestore_client.collection(COLLECTIONS["document_requests"]).document(request_id).set(doc_request)
         return request_id
     
     def cleanup_old_content(self, days_old: int = 30):
         """Clean up old Cloud Storage content (optional maintenance)."""
-        from datetime import timedelta
-        
         cutoff_date = datetime.utcnow() - timedelta(days=days_old)
         
-        # List and delete old blobs
-        blobs = self.bucket.list_blobs(prefix="messages/")
+        # Delete old blobs 100 per batch request
+        old_blobs = self._expired_message_blobs(cutoff_date)
         deleted_count = 0
         
-        for blob in blobs:
-            if blob.time_created.replace(tzinfo=None) < cutoff_date:
-                blob.delete()
-                deleted_count += 1
+        while chunk := list(islice(old_blobs, 100)):
+            with self.storage_client.batch():
+                for blob in chunk:
+                    blob.delete()
+            deleted_count += len(chunk)
         
         return deleted_count
+    
+    def _child_prefixes(self, prefix: str) -> list:
+        """List the immediate child prefixes (folders) under a blob prefix."""
+        iterator = self.bucket.list_blobs(prefix=prefix, delimiter="/", fields="prefixes,nextPageToken")
+        for _ in iterator.pages:
+            pass
+        return sorted(iterator.prefixes)
+    
+    def _expired_message_blobs(self, cutoff_date: datetime):
+        """Yield message blobs older than cutoff_date, listing only expired date prefixes."""
+        fields = "items(name,timeCreated),nextPageToken"
+        cutoff_day = cutoff_date.date()
+        
+        for year_prefix in self._child_prefixes("messages/"):
+            year = year_prefix.split("/")[1]
+            if not year.isdigit():
+                # Legacy messages/{conversation_id}/ layout: filter on creation time
+                for blob in self.bucket.list_blobs(prefix=year_prefix, fields=fields):
+                    if blob.time_created.replace(tzinfo=None) < cutoff_date:
+                        yield blob
+                continue
+            
+            year = int(year)
+            if year > cutoff_day.year:
+                continue
+            for month in range(1, 13 if year < cutoff_day.year else cutoff_day.month + 1):
+                if (year, month) < (cutoff_day.year, cutoff_day.month):
+                    # Whole month is expired
+                    prefixes = [f"{year_prefix}{month:02d}/"]
+                else:
+                    # Cutoff month: only the days strictly before the cutoff day
+                    prefixes = [f"{year_prefix}{month:02d}/{day:02d}/" for day in range(1, cutoff_day.day)]
+                for prefix in prefixes:
+                    yield from self.bucket.list_blobs(prefix=prefix, fields=fields)
+
+# Message fields returned by conversation listings
+MESSAGE_LIST_FIELDS = [
+    "id", "role", "content", "storage_type", "content_url", "content_size", "timestamp", "metadata.attachments"
+]
 
 # Smart storage service with automatic fallback
 class SimpleMessageService:
@@ -282,34 +1022,235 @@ class SimpleMessageService:
             self.storage = LocalStorage()
             self.storage_type = "local"
             print("📁 Using local file storage")
+        
+        # Short-lived read caches, invalidated on writes from this process
+        self.messages_cache = ReadCache(PRODUCTION_STORAGE["read_cache_size"], PRODUCTION_STORAGE["read_cache_ttl"])
+        self.conversations_cache = ReadCache(PRODUCTION_STORAGE["read_cache_size"], PRODUCTION_STORAGE["read_cache_ttl"])
+        # Owner of every conversation this process created or listed, so a write only
+        # drops that user's cached listings
+        self._conversation_owners: Dict[str, str] = {}
+        # Rewrites stale message cache blobs off the read path
+        self._rebuild_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="message-cache-rebuild")
+        # Messages accepted for a background write but not yet stored, per conversation;
+        # reads merge them in so a GET right after the response already sees them
+        self._pending_messages: Dict[str, Dict[str, dict]] = {}
+        self._pending_lock = threading.Lock()
+    
+    def cache_stats(self) -> dict:
+        """Hit/miss counters for the read caches."""
+        stats = {
+            "messages": self.messages_cache.stats(),
+            "conversations": self.conversations_cache.stats()
+        }
+        if self.storage_type == "cloud":
+            stats["content"] = self.storage.content_cache.stats()
+        return stats
     
-    def add_message_to_conversation(self, conversation_id: str, role: str, content: str, attachments: list = None):
+    def add_message_to_conversation(self, conversation_id: str, role: str, content: str, attachments: list = None,
+                                    message_id: str = None):
         """Add message - compatible with existing code."""
         metadata = {"attachments": attachments or []}
-        return self.storage.store_message(conversation_id, role, content, metadata)
+        message_id = self.storage.store_message(conversation_id, role, content, metadata, message_id)
+        self.messages_cache.invalidate(conversation_id)
+        self._invalidate_listings(conversation_id)
+        return message_id
+    
+    def stage_message(self, conversation_id: str, role: str, content: str) -> dict:
+        """Register a message that write_staged_message will store in the background."""
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:12]}",
+            "conversation_id": conversation_id,
+            "role": role,
+            "content": content,
+            "timestamp": datetime.utcnow(),
+            "attachments": []
+        }
+        with self._pending_lock:
+            self._pending_messages.setdefault(conversation_id, {})[message["id"]] = message
+        return message
+    
+    def write_staged_message(self, message: dict, attempts: int = 3):
+        """Store a staged message (under its staged id), retrying transient failures."""
+        conversation_id = message["conversation_id"]
+        try:
+            for attempt in range(attempts):
+                try:
+                    self.add_message_to_conversation(
+                        conversation_id, message["role"], message["content"], message_id=message["id"]
+                    )
+                    return
+                except Exception as e:
+                    if attempt == attempts - 1:
+                        raise
+                    logger.warning(f"Storing message {message['id']} failed (attempt {attempt + 1}), retrying: {e}")
+                    time.sleep(0.5 * 2 ** attempt)
+        finally:
+            # The write has landed and the read caches are invalidated (or it failed for good)
+            with self._pending_lock:
+                pending = self._pending_messages.get(conversation_id, {})
+                pending.pop(message["id"], None)
+                if not pending:
+                    self._pending_messages.pop(conversation_id, None)
+    
+    def _with_pending(self, conversation_id: str, messages: list, limit: int = None, before_timestamp: str = None) -> list:
+        """Append staged messages not yet visible in storage to the newest page."""
+        if before_timestamp:
+            return messages
+        with self._pending_lock:
+            pending = list(self._pending_messages.get(conversation_id, {}).values())
+        if not pending:
+            return messages
+        stored = {message["id"] for message in messages}
+        merged = messages + [message for message in pending if message["id"] not in stored]
+        return merged[-limit:] if limit else merged
     
-    def get_conversation_messages(self, conversation_id: str) -> list:
-        """Get all messages for a conversation."""
+    def batch_add_messages(self, conversation_id: str, messages: list) -> list:
+        """Add several (role, content) messages in one storage write."""
+        message_ids = self.storage.store_messages(conversation_id, messages, {"attachments": []})
+        self.messages_cache.invalidate(conversation_id)
+        self._invalidate_listings(conversation_id)
+        return message_ids
+    
+    def _invalidate_listings(self, conversation_id: str):
+        """Drop the cached listings of the user owning a conversation (message_count, title changed)."""
+        # An unknown owner means no cached listing holds the conversation; invalidating by
+        # the conversation id matches no user key but still stops an in-flight listing from caching
+        self.conversations_cache.invalidate(self._conversation_owners.get(conversation_id, conversation_id))
+    
+    def _rebuild_message_cache_blob(self, conversation_id: str, messages: list, message_count: int):
+        """Background rewrite of a stale message blob from a list a read already fetched."""
+        try:
+            self.storage.write_message_cache_blob(conversation_id, messages, message_count)
+        except Exception as e:
+            logger.error(f"Rebuilding message cache blob for {conversation_id} failed: {e}")
+    
+    def get_conversation_messages(self, conversation_id: str, limit: int = None, before_timestamp: str = None) -> list:
+        """Get messages for a conversation, optionally the newest `limit` before a timestamp."""
+        cache_key = (conversation_id, limit, before_timestamp)
+        messages = self.messages_cache.get(cache_key)
+        if messages is None:
+            generation = self.messages_cache.generation()
+            messages = self._fetch_conversation_messages(conversation_id, limit, before_timestamp)
+            self.messages_cache.set(cache_key, messages, generation)
+        return self._with_pending(conversation_id, messages, limit, before_timestamp)
+    
+    async def aget_conversation_messages(self, conversation_id: str, limit: int = None, before_timestamp: str = None) -> list:
+        """Async get_conversation_messages; cache hits never leave the event loop."""
+        cache_key = (conversation_id, limit, before_timestamp)
+        messages = self.messages_cache.get(cache_key)
+        if messages is None:
+            generation = self.messages_cache.generation()
+            if self.storage_type == "local":
+                messages = await asyncio.to_thread(self.storage.get_conversation_messages, conversation_id, limit, before_timestamp)
+            else:
+                messages = await self._afetch_conversation_messages(conversation_id, limit, before_timestamp)
+            self.messages_cache.set(cache_key, messages, generation)
+        return self._with_pending(conversation_id, messages, limit, before_timestamp)
+    
+    def _messages_query(self, client, conversation_id: str, limit: int = None, before_timestamp: str = None):
+        # Project only what _build_messages reads (skips content_preview, content_hash, ...)
+        query = client.collection(COLLECTIONS["messages"])\
+                    .where("conversation_id", "==", conversation_id)\
+                    .select(MESSAGE_LIST_FIELDS)
+        if before_timestamp:
+            query = query.where("timestamp", "<", datetime.fromisoformat(before_timestamp))
+        
+        if limit is not None:
+            # Fetch only the requested page newest-first; callers restore chronological order
+            return query.order_by("timestamp", direction=firestore.Query.DESCENDING).limit(limit)
+        return query.order_by("timestamp")
+    
+    def _fetch_conversation_messages(self, conversation_id: str, limit: int = None, before_timestamp: str = None) -> list:
         if self.storage_type == "local":
-            return self.storage.get_conversation_messages(conversation_id)
+            return self.storage.get_conversation_messages(conversation_id, limit, before_timestamp)
         
-        # Cloud storage logic
-        messages = []
-        from config import COLLECTIONS
-        docs = self.storage.firestore_client.collection(COLLECTIONS["messages"])\
-                   .where("conversation_id", "==", conversation_id)\
-                   .order_by("timestamp").get()
+        # Cloud storage logic; full histories come from a precomputed or log blob in one GET when enabled
+        full_history = limit is None and not before_timestamp
+        message_count = None
+        if full_history and self.storage.message_cache_blob:
+            # Read the counter before the messages, so a rebuilt blob never claims more than it holds
+            message_count = self.storage.conversation_message_count(conversation_id)
+            if message_count is not None:
+                messages = self.storage.read_message_cache_blob(conversation_id, message_count)
+                if messages is not None:
+                    return messages
         
-        for doc in docs:
-            data = doc.to_dict()
-            
+        docs = None
+        if self.storage.conversation_log and full_history:
+            docs = self.storage.read_conversation_log(conversation_id)
+        if docs is None:
+            query = self._messages_query(self.storage.firestore_client, conversation_id, limit, before_timestamp)
+            docs = [doc.to_dict() for doc in query.stream()]
+            if limit is not None:
+                docs.reverse()
+        
+        # Download Cloud Storage content for all offloaded messages in parallel
+        offloaded = [data for data in docs if data.get("storage_type") != "firestore"]
+        downloaded = dict(zip(
+            (data["id"] for data in offloaded),
+            self.storage.io_pool.map(
+                self.storage.download_content,
+                (data.get("content_url", "") for data in offloaded),
+                (data.get("content_size", 0) for data in offloaded)
+            )
+        ))
+        messages = self._build_messages(conversation_id, docs, downloaded)
+        if message_count is not None:
+            self._rebuild_pool.submit(self._rebuild_message_cache_blob, conversation_id, messages, message_count)
+        return messages
+    
+    async def _afetch_conversation_messages(self, conversation_id: str, limit: int = None, before_timestamp: str = None) -> list:
+        loop = asyncio.get_running_loop()
+        full_history = limit is None and not before_timestamp
+        message_count = None
+        if full_history and self.storage.message_cache_blob:
+            message_count = await loop.run_in_executor(
+                self.storage.io_pool, self.storage.conversation_message_count, conversation_id
+            )
+            if message_count is not None:
+                messages = await loop.run_in_executor(
+                    self.storage.io_pool, self.storage.read_message_cache_blob, conversation_id, message_count
+                )
+                if messages is not None:
+                    return messages
+        
+        docs = None
+        if self.storage.conversation_log and full_history:
+            docs = await loop.run_in_executor(
+                self.storage.io_pool, self.storage.read_conversation_log, conversation_id
+            )
+        if docs is None:
+            query = self._messages_query(self.storage.async_firestore_client, conversation_id, limit, before_timestamp)
+            docs = [doc.to_dict() async for doc in query.stream()]
+            if limit is not None:
+                docs.reverse()
+        
+        # Gather the blob downloads on the storage I/O pool using the docs already in hand
+        offloaded = [data for data in docs if data.get("storage_type") != "firestore"]
+        contents = await asyncio.gather(*(
+            loop.run_in_executor(
+                self.storage.io_pool, self.storage.download_content, data.get("content_url", ""), data.get("content_size", 0)
+            )
+            for data in offloaded
+        ))
+        downloaded = dict(zip((data["id"] for data in offloaded), contents))
+        messages = self._build_messages(conversation_id, docs, downloaded)
+        if message_count is not None:
+            self._rebuild_pool.submit(self._rebuild_message_cache_blob, conversation_id, messages, message_count)
+        return messages
+    
+    def _build_messages(self, conversation_id: str, docs: list, downloaded: dict) -> list:
+        messages = []
+        for data in docs:
             # Get full content
             if data.get("storage_type") == "firestore":
                 content = data.get("content", "")
             else:
-                content = self.storage.get_message_content(data["id"])
+                content = downloaded[data["id"]]
             
             messages.append({
+                "id": data["id"],
+                "conversation_id": conversation_id,
                 "role": data["role"],
                 "content": content,
                 "timestamp": data["timestamp"],
@@ -320,6 +1261,8 @@ class SimpleMessageService:
     
     def create_conversation(self, conversation_id: str, user_id: str, title: str) -> dict:
         """Create a new conversation."""
+        self._conversation_owners[conversation_id] = user_id
+        self.conversations_cache.invalidate(user_id)
         if self.storage_type == "local":
             return self.storage.create_conversation(conversation_id, user_id, title)
         
@@ -333,7 +1276,6 @@ class SimpleMessageService:
             "message_count": 0
         }
         
-        from config import COLLECTIONS
         self.storage.firestore_client.collection(COLLECTIONS["conversations"]).document(conversation_id).set(conversation_data)
         return {
             "id": conversation_id,
@@ -343,16 +1285,27 @@ class SimpleMessageService:
     
     def get_user_conversations(self, user_id: str, limit: int = 50, offset: int = 0) -> list:
         """Get all conversations for a user."""
+        cache_key = (user_id, limit, offset)
+        conversations = self.conversations_cache.get(cache_key)
+        if conversations is None:
+            generation = self.conversations_cache.generation()
+            conversations = self._fetch_user_conversations(user_id, limit, offset)
+            for conversation in conversations:
+                self._conversation_owners[conversation["id"]] = user_id
+            self.conversations_cache.set(cache_key, conversations, generation)
+        return conversations
+    
+    def _fetch_user_conversations(self, user_id: str, limit: int = 50, offset: int = 0) -> list:
         if self.storage_type == "local":
             return self.storage.get_user_conversations(user_id, limit, offset)
         
         # Cloud storage logic
         conversations = []
-        from config import COLLECTIONS
         docs = self.storage.firestore_client.collection(COLLECTIONS["conversations"])\
                    .where("user_id", "==", user_id)\
                    .order_by("updated_at", direction=firestore.Query.DESCENDING)\
-                   .limit(limit).offset(offset).get()
+                   .select(["id", "title", "created_at", "message_count"])\
+                   .limit(limit).offset(offset).stream()
         
         for doc in docs:
             data = doc.to_dict()
@@ -368,16 +1321,18 @@ class SimpleMessageService:
     def update_conversation_title(self, conversation_id: str, title: str) -> bool:
         """Update conversation title."""
         if self.storage_type == "local":
-            return self.storage.update_conversation_title(conversation_id, title)
+            updated = self.storage.update_conversation_title(conversation_id, title)
+            self._invalidate_listings(conversation_id)
+            return updated
         
         # Cloud storage logic
         try:
-            from config import COLLECTIONS
             doc_ref = self.storage.firestore_client.collection(COLLECTIONS["conversations"]).document(conversation_id)
             doc_ref.update({
                 "title": title,
                 "updated_at": datetime.utcnow()
             })
+            self._invalidate_listings(conversation_id)
             return True
         except Exception as e:
             logger.error(f"Error updating conversation title: {str(e)}")
@@ -2,20 +2,124 @@
 
 from google.adk.agents import LlmAgent
 # Functions will be automatically wrapped as FunctionTools
-import json
+import orjson
 import os
+import re
+import atexit
+import logging
+import threading
 import time
 from datetime import datetime
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 import mimetypes
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
 
 MODEL = "gemini-2.0-flash"
 
+OPPORTUNITIES_DIR = "teamcentre_mock/opportunities"
+
+# Parsed ingestion status per request (LRU), so progress ticks don't re-read the file
+_STATUS_CACHE: OrderedDict[str, dict] = OrderedDict()
+_DIRTY: set[str] = set()
+STATUS_CACHE_SIZE = 256
+# Progress ticks between status file writes
+FLUSH_EVERY = 8
+
+@lru_cache(maxsize=256)
+def _status_file(request_id: str) -> Path:
+    """Path of a request's ingestion status file, built once per request."""
+    return Path(OPPORTUNITIES_DIR, request_id, "metadata", "ingestion_status.json")
+
+def _load_status(request_id: str) -> dict | None:
+    """Return the cached ingestion status, reading the status file only on a cold miss.
+    
+    Returns None if the request has no ingestion status.
+    """
+    ingestion_status = _STATUS_CACHE.get(request_id)
+    if ingestion_status is None:
+        try:
+            ingestion_status = orjson.loads(_status_file(request_id).read_bytes())
+        except FileNotFoundError:
+            return None
+        _cache_status(request_id, ingestion_status)
+    else:
+        _STATUS_CACHE.move_to_end(request_id)
+    return ingestion_status
+
+def load_ingestion_status(request_id: str) -> dict | None:
+    """Current ingestion status (including progress not yet written to disk), or None.
+    
+    Returns a copy, so callers can't modify the cached status.
+    """
+    ingestion_status = _load_status(request_id)
+    return None if ingestion_status is None else dict(ingestion_status)
+
+def _cache_status(request_id: str, ingestion_status: dict):
+    """Cache a status, evicting the least recently used one (written out first if dirty)."""
+    _STATUS_CACHE[request_id] = ingestion_status
+    _STATUS_CACHE.move_to_end(request_id)
+    if len(_STATUS_CACHE) > STATUS_CACHE_SIZE:
+        evicted_id, evicted_status = _STATUS_CACHE.popitem(last=False)
+        if evicted_id in _DIRTY:
+            _flush_status(_status_file(evicted_id), evicted_id, evicted_status)
+
+@contextmanager
+def _edit_status(request_id: str):
+    """Yield the ingestion status for in-place edits (None if missing) and mark it dirty afterwards."""
+    ingestion_status = _load_status(request_id)
+    yield ingestion_status
+    if ingestion_status is not None:
+        _DIRTY.add(request_id)
+
+def _flush_status(status_file: Path, request_id: str, ingestion_status: dict):
+    """Write the status file now and clear the request's dirty flag."""
+    # Write beside the target and rename so readers never see a half-written status
+    tmp_file = status_file.with_name(f"{status_file.name}.{threading.get_ident()}.tmp")
+    tmp_file.write_bytes(orjson.dumps(ingestion_status, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_file, status_file)
+    _DIRTY.discard(request_id)
+
+@atexit.register
+def _flush_dirty():
+    """Write statuses with unflushed progress ticks before the process exits."""
+    for request_id in list(_DIRTY):
+        ingestion_status = _STATUS_CACHE.get(request_id)
+        if ingestion_status is None:
+            _DIRTY.discard(request_id)
+            continue
+        try:
+            _flush_status(_status_file(request_id), request_id, ingestion_status)
+        except OSError as e:
+            logger.warning(f"Failed to write ingestion status for {request_id}: {e}")
+
+# Upload URLs whose last path segment is the stored filename
+_UPLOAD_URL_RE = re.compile(r"/(?:rfp-documents|uploads)/")
+
+def _build_file_record(file_info: dict) -> dict:
+    """Build the pending ingestion record for one uploaded file."""
+    get = file_info.get
+    # Extract filename from file_url if provided
+    filename = get("filename", "unknown")
+    file_url = get("file_url", "")
+    if filename == "unknown" and file_url and _UPLOAD_URL_RE.search(file_url):
+        filename = file_url.rsplit("/", 1)[-1]
+    return {
+        "filename": get("original_filename", filename),
+        "stored_filename": get("stored_filename", filename),
+        "file_url": file_url,
+        "size": get("file_size", get("size", 0)),
+        "type": get("type", "unknown"),
+        "status": "pending",
+        "processed_at": None
+    }
+
 def start_document_ingestion(request_id: str, file_list: list[dict]) -> dict:
     """Start document ingestion process with progress tracking."""
-    opportunity_dir = Path("teamcentre_mock/opportunities") / request_id
-    
-    if not opportunity_dir.exists():
+    if not os.path.isdir(os.path.join(OPPORTUNITIES_DIR, request_id)):
         return {"error": "Opportunity not found", "request_id": request_id}
     
     # Create ingestion status file
@@ -27,36 +131,13 @@ def start_document_ingestion(request_id: str, file_list: list[dict]) -> dict:
         "processed_files": 0,
         "current_file": None,
         "progress_percentage": 0,
-        "files": []
+        "files": [_build_file_record(file_info) for file_info in file_list]
     }
     
-    for file_info in file_list:
-        # Extract filename from file_url if provided
-        filename = file_info.get("filename", "unknown")
-        if "file_url" in file_info and filename == "unknown":
-            file_url = file_info["file_url"]
-            if "/rfp-documents/" in file_url:
-                # Extract stored filename from RFP document URL
-                filename = file_url.split("/")[-1]
-            elif "/uploads/" in file_url:
-                # Extract stored filename from general upload URL
-                filename = file_url.split("/")[-1]
-        
-        file_record = {
-            "filename": file_info.get("original_filename", filename),
-            "stored_filename": file_info.get("stored_filename", filename),
-            "file_url": file_info.get("file_url", ""),
-            "size": file_info.get("file_size", file_info.get("size", 0)),
-            "type": file_info.get("type", "unknown"),
-            "status": "pending",
-            "processed_at": None
-        }
-        ingestion_status["files"].append(file_record)
-    
     # Save initial status
-    status_file = opportunity_dir / "metadata" / "ingestion_status.json"
-    with open(status_file, 'w') as f:
-        json.dump(ingestion_status, f, indent=2)
+    status_file = _status_file(request_id)
+    _cache_status(request_id, ingestion_status)
+    _flush_status(status_file, request_id, ingestion_status)
     
     return {
         "request_id": request_id,
@@ -67,36 +148,32 @@ def start_document_ingestion(request_id: str, file_list: list[dict]) -> dict:
 
 def update_ingestion_progress(request_id: str, file_index: int) -> dict:
     """Update progress for a specific file during ingestion."""
-    opportunity_dir = Path("teamcentre_mock/opportunities") / request_id
-    status_file = opportunity_dir / "metadata" / "ingestion_status.json"
-    
-    if not status_file.exists():
-        return {"error": "Ingestion status not found", "request_id": request_id}
-    
-    with open(status_file, 'r') as f:
-        ingestion_status = json.load(f)
-    
-    if file_index < len(ingestion_status["files"]):
-        # Update file status
-        ingestion_status["files"][file_index]["status"] = "processed"
-        ingestion_status["files"][file_index]["processed_at"] = datetime.now().isoformat()
-        
-        # Update overall progress
-        ingestion_status["processed_files"] = file_index + 1
-        ingestion_status["progress_percentage"] = round(
-            (ingestion_status["processed_files"] / ingestion_status["total_files"]) * 100, 1
-        )
+    with _edit_status(request_id) as ingestion_status:
+        if ingestion_status is None:
+            return {"error": "Ingestion status not found", "request_id": request_id}
         
-        if file_index < len(ingestion_status["files"]) - 1:
-            ingestion_status["current_file"] = ingestion_status["files"][file_index + 1]["filename"]
-        else:
-            ingestion_status["status"] = "completed"
-            ingestion_status["completed_at"] = datetime.now().isoformat()
-            ingestion_status["current_file"] = None
+        if file_index < len(ingestion_status["files"]):
+            now_iso = datetime.now().isoformat()
+            # Update file status
+            ingestion_status["files"][file_index]["status"] = "processed"
+            ingestion_status["files"][file_index]["processed_at"] = now_iso
+            
+            # Update overall progress
+            ingestion_status["processed_files"] = file_index + 1
+            ingestion_status["progress_percentage"] = round(
+                (ingestion_status["processed_files"] / ingestion_status["total_files"]) * 100, 1
+            )
+            
+            if file_index < len(ingestion_status["files"]) - 1:
+                ingestion_status["current_file"] = ingestion_status["files"][file_index + 1]["filename"]
+            else:
+                ingestion_status["status"] = "completed"
+                ingestion_status["completed_at"] = now_iso
+                ingestion_status["current_file"] = None
     
-    # Save updated status
-    with open(status_file, 'w') as f:
-        json.dump(ingestion_status, f, indent=2)
+    # Save updated status every few ticks and on the last file
+    if file_index % FLUSH_EVERY == 0 or ingestion_status["status"] == "completed":
+        _flush_status(_status_file(request_id), request_id, ingestion_status)
     
     return {
         "request_id": request_id,
@@ -108,57 +185,54 @@ def update_ingestion_progress(request_id: str, file_index: int) -> dict:
 
 def get_ingestion_status(request_id: str) -> dict:
     """Get current ingestion status for an opportunity."""
-    opportunity_dir = Path("teamcentre_mock/opportunities") / request_id
-    status_file = opportunity_dir / "metadata" / "ingestion_status.json"
+    # In-memory status is newer than the file between flushes
+    ingestion_status = _load_status(request_id)
     
-    if not status_file.exists():
+    if ingestion_status is None:
         return {"error": "Ingestion status not found", "request_id": request_id}
     
-    with open(status_file, 'r') as f:
-        ingestion_status = json.load(f)
-    
     return ingestion_status
 
+def _completion_result(request_id: str, summary: dict) -> dict:
+    return {
+        "request_id": request_id,
+        "status": "completed",
+        "summary": summary,
+        "message": f"Document ingestion completed successfully for {summary['total_files_processed']} files"
+    }
+
 def complete_ingestion(request_id: str) -> dict:
     """Mark ingestion as completed and generate summary."""
-    opportunity_dir = Path("teamcentre_mock/opportunities") / request_id
-    status_file = opportunity_dir / "metadata" / "ingestion_status.json"
-    
-    if not status_file.exists():
+    ingestion_status = _load_status(request_id)
+    if ingestion_status is None:
         return {"error": "Ingestion status not found", "request_id": request_id}
     
-    with open(status_file, 'r') as f:
-        ingestion_status = json.load(f)
-    
-    # Mark as completed
-    ingestion_status["status"] = "completed"
-    ingestion_status["completed_at"] = datetime.now().isoformat()
+    # Already finalized by an earlier call, so there is nothing to recompute or rewrite
+    if ingestion_status.get("summary"):
+        _STATUS_CACHE.pop(request_id, None)
+        return _completion_result(request_id, ingestion_status["summary"])
     
-    # Generate summary
-    summary = {
-        "total_files_processed": ingestion_status["total_files"],
-        "processing_duration": "Completed",
-        "files_by_type": {},
-        "ready_for_proposal": True
-    }
-    
-    # Count files by type
-    for file_info in ingestion_status["files"]:
-        file_type = file_info.get("type", "unknown")
-        summary["files_by_type"][file_type] = summary["files_by_type"].get(file_type, 0) + 1
-    
-    ingestion_status["summary"] = summary
+    with _edit_status(request_id) as ingestion_status:
+        # Mark as completed
+        ingestion_status["status"] = "completed"
+        ingestion_status["completed_at"] = datetime.now().isoformat()
+        
+        # Generate summary
+        summary = {
+            "total_files_processed": ingestion_status["total_files"],
+            "processing_duration": "Completed",
+            # Count files by type
+            "files_by_type": dict(Counter(file_info.get("type", "unknown") for file_info in ingestion_status["files"])),
+            "ready_for_proposal": True
+        }
+        
+        ingestion_status["summary"] = summary
     
-    # Save final status
-    with open(status_file, 'w') as f:
-        json.dump(ingestion_status, f, indent=2)
+    # Save final status and drop it from the cache
+    _flush_status(_status_file(request_id), request_id, ingestion_status)
+    _STATUS_CACHE.pop(request_id, None)
     
-    return {
-        "request_id": request_id,
-        "status": "completed",
-        "summary": summary,
-        "message": f"Document ingestion completed successfully for {summary['total_files_processed']} files"
-    }
+    return _completion_result(request_id, summary)
 
 document_ingestion_agent = LlmAgent(
     name="document_ingestion",
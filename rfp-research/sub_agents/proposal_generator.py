@@ -2,44 +2,135 @@
 
 from google.adk.agents import LlmAgent
 # Functions will be automatically wrapped as FunctionTools
-import json
+import orjson
 import os
 from datetime import datetime
 from pathlib import Path
+from .document_ingestion import load_ingestion_status
 
 MODEL = "gemini-2.0-flash"
 
+_NL = "\n"
+
+OPPORTUNITIES_DIR = "teamcentre_mock/opportunities"
+_OPPORTUNITIES_PATH = Path(OPPORTUNITIES_DIR)
+
+# Proposal markdown, filled in with a single str.format call
+_PROPOSAL_TEMPLATE = """
+# PROPOSAL DOCUMENT
+## Request ID: {request_id}
+## Generated: {generated}
+
+---
+
+## {executive_summary_title}
+
+{executive_summary_content}
+
+### Key Highlights:
+{key_points}
+
+---
+
+## {requirements_title}
+
+{requirements_content}
+
+### Requirements Analysis:
+{requirements_sections}
+
+---
+
+## {technical_title}
+
+Our comprehensive technical approach ensures successful project delivery through proven methodologies and best practices.
+
+### Approach Components:
+{technical_sections}
+
+---
+
+## {timeline_title}
+
+**Project Deadline:** {deadline}
+
+### Delivery Phases:
+{phases}
+
+---
+
+## {team_title}
+
+Our experienced team brings deep expertise and proven track record to ensure project success.
+
+### Team Strengths:
+{team_sections}
+
+---
+
+## Conclusion
+
+We are confident in our ability to deliver exceptional results for this project. Our comprehensive approach, experienced team, and commitment to quality make us the ideal partner for your requirements.
+
+Thank you for considering our proposal. We look forward to discussing this opportunity further.
+
+---
+*This proposal was generated by the RFP Research Agent system*
+"""
+
+def _bullets(items: list) -> str:
+    return _NL.join(f"• {item}" for item in items)
+
+def _read_json(path) -> dict | None:
+    """Parse a JSON file, or return None if it doesn't exist."""
+    try:
+        # Whole-file read, so skip the BufferedReader layer
+        with open(path, "rb", buffering=0) as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+
 def retrieve_opportunity_data(request_id: str) -> dict:
     """Retrieve complete opportunity data for proposal generation."""
-    opportunity_dir = Path("teamcentre_mock/opportunities") / request_id
-    
-    if not opportunity_dir.exists():
-        return {"error": "Opportunity not found", "request_id": request_id}
+    opportunity_dir = os.path.join(OPPORTUNITIES_DIR, request_id)
     
     # Load opportunity metadata
-    metadata_file = opportunity_dir / "metadata" / "opportunity.json"
-    ingestion_file = opportunity_dir / "metadata" / "ingestion_status.json"
+    opportunity = _read_json(os.path.join(opportunity_dir, "metadata", "opportunity.json"))
+    
+    # Only stat the folder when the metadata is missing
+    if opportunity is None and not os.path.isdir(opportunity_dir):
+        return {"error": "Opportunity not found", "request_id": request_id}
     
     data = {"request_id": request_id}
     
-    if metadata_file.exists():
-        with open(metadata_file, 'r') as f:
-            data["opportunity"] = json.load(f)
+    if opportunity is not None:
+        data["opportunity"] = opportunity
     
-    if ingestion_file.exists():
-        with open(ingestion_file, 'r') as f:
-            data["ingestion"] = json.load(f)
+    # Through document_ingestion: the status file lags behind between flushes
+    ingestion = load_ingestion_status(request_id)
+    if ingestion is not None:
+        data["ingestion"] = ingestion
     
     return data
 
+def _project_fields(opportunity_data: dict) -> tuple[str, str, str]:
+    """Pull (project_name, requirements, deadline) out of opportunity data in one pass."""
+    project_details = (opportunity_data.get("opportunity") or {}).get("project_details") or {}
+    get = project_details.get
+    return (
+        get("project_name", "RFP Project"),
+        get("requirements", "Requirements analysis"),
+        get("deadline", "TBD"),
+    )
+
 def generate_proposal_outline(opportunity_data: dict) -> dict:
     """Generate comprehensive proposal outline based on opportunity data."""
-    project_details = opportunity_data.get("opportunity", {}).get("project_details", {})
+    project_name, requirements, deadline = _project_fields(opportunity_data)
     
     outline = {
         "executive_summary": {
             "title": "Executive Summary",
-            "content": f"Proposal for {project_details.get('project_name', 'RFP Project')}",
+            "content": f"Proposal for {project_name}",
             "key_points": [
                 "Understanding of client requirements",
                 "Proposed solution approach",
@@ -49,7 +140,7 @@ def generate_proposal_outline(opportunity_data: dict) -> dict:
         },
         "understanding_requirements": {
             "title": "Understanding of Requirements",
-            "content": project_details.get("requirements", "Requirements analysis"),
+            "content": requirements,
             "sections": [
                 "Client objectives",
                 "Scope of work",
@@ -68,7 +159,7 @@ def generate_proposal_outline(opportunity_data: dict) -> dict:
         },
         "timeline_deliverables": {
             "title": "Timeline & Deliverables",
-            "deadline": project_details.get("deadline", "TBD"),
+            "deadline": deadline,
             "phases": [
                 "Phase 1: Analysis & Planning",
                 "Phase 2: Development & Implementation", 
@@ -91,89 +182,43 @@ def generate_proposal_outline(opportunity_data: dict) -> dict:
 
 def create_proposal_document(request_id: str, outline: dict) -> dict:
     """Create final proposal document and save to opportunity folder."""
-    opportunity_dir = Path("teamcentre_mock/opportunities") / request_id
-    proposals_dir = opportunity_dir / "proposals"
+    proposals_dir = _OPPORTUNITIES_PATH / request_id / "proposals"
+    now = datetime.now()
     
     # Create comprehensive proposal content
-    proposal_content = f"""
-# PROPOSAL DOCUMENT
-## Request ID: {request_id}
-## Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
----
-
-## {outline['executive_summary']['title']}
-
-{outline['executive_summary']['content']}
-
-### Key Highlights:
-{chr(10).join([f"• {point}" for point in outline['executive_summary']['key_points']])}
-
----
-
-## {outline['understanding_requirements']['title']}
-
-{outline['understanding_requirements']['content']}
-
-### Requirements Analysis:
-{chr(10).join([f"• {section}" for section in outline['understanding_requirements']['sections']])}
-
----
-
-## {outline['technical_approach']['title']}
-
-Our comprehensive technical approach ensures successful project delivery through proven methodologies and best practices.
-
-### Approach Components:
-{chr(10).join([f"• {section}" for section in outline['technical_approach']['sections']])}
-
----
-
-## {outline['timeline_deliverables']['title']}
-
-**Project Deadline:** {outline['timeline_deliverables']['deadline']}
-
-### Delivery Phases:
-{chr(10).join([f"{i+1}. {phase}" for i, phase in enumerate(outline['timeline_deliverables']['phases'])])}
-
----
-
-## {outline['team_qualifications']['title']}
-
-Our experienced team brings deep expertise and proven track record to ensure project success.
-
-### Team Strengths:
-{chr(10).join([f"• {section}" for section in outline['team_qualifications']['sections']])}
-
----
-
-## Conclusion
-
-We are confident in our ability to deliver exceptional results for this project. Our comprehensive approach, experienced team, and commitment to quality make us the ideal partner for your requirements.
-
-Thank you for considering our proposal. We look forward to discussing this opportunity further.
-
----
-*This proposal was generated by the RFP Research Agent system*
-"""
+    proposal_content = _PROPOSAL_TEMPLATE.format(
+        request_id=request_id,
+        generated=now.strftime('%Y-%m-%d %H:%M:%S'),
+        executive_summary_title=outline['executive_summary']['title'],
+        executive_summary_content=outline['executive_summary']['content'],
+        key_points=_bullets(outline['executive_summary']['key_points']),
+        requirements_title=outline['understanding_requirements']['title'],
+        requirements_content=outline['understanding_requirements']['content'],
+        requirements_sections=_bullets(outline['understanding_requirements']['sections']),
+        technical_title=outline['technical_approach']['title'],
+        technical_sections=_bullets(outline['technical_approach']['sections']),
+        timeline_title=outline['timeline_deliverables']['title'],
+        deadline=outline['timeline_deliverables']['deadline'],
+        phases=_NL.join(f"{i}. {phase}" for i, phase in enumerate(outline['timeline_deliverables']['phases'], 1)),
+        team_title=outline['team_qualifications']['title'],
+        team_sections=_bullets(outline['team_qualifications']['sections']),
+    )
     
     # Save proposal document
-    proposal_file = proposals_dir / f"proposal_{request_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
-    with open(proposal_file, 'w') as f:
-        f.write(proposal_content)
+    proposal_file = proposals_dir / f"proposal_{request_id}_{now.strftime('%Y%m%d_%H%M%S')}.md"
+    proposal_file.write_text(proposal_content)
     
     # Create proposal metadata
     proposal_metadata = {
         "request_id": request_id,
-        "generated_at": datetime.now().isoformat(),
+        "generated_at": now.isoformat(),
         "file_path": str(proposal_file),
         "status": "generated",
         "outline": outline
     }
     
     metadata_file = proposals_dir / f"proposal_metadata_{request_id}.json"
-    with open(metadata_file, 'w') as f:
-        json.dump(proposal_metadata, f, indent=2)
+    metadata_file.write_bytes(orjson.dumps(proposal_metadata, option=orjson.OPT_INDENT_2))
     
     return {
         "request_id": request_id,
@@ -185,26 +230,20 @@ Thank you for considering our proposal. We look forward to discussing this oppor
 
 def get_proposal_summary(request_id: str) -> dict:
     """Get proposal summary for chat interface display."""
-    opportunity_dir = Path("teamcentre_mock/opportunities") / request_id
-    proposals_dir = opportunity_dir / "proposals"
+    proposals_dir = _OPPORTUNITIES_PATH / request_id / "proposals"
     
-    # Find latest proposal metadata
-    metadata_files = list(proposals_dir.glob(f"proposal_metadata_{request_id}.json"))
+    # Proposal metadata has a fixed name per request, so no directory scan is needed
+    proposal_data = _read_json(proposals_dir / f"proposal_metadata_{request_id}.json")
     
-    if not metadata_files:
+    if proposal_data is None:
         return {"error": "No proposal found", "request_id": request_id}
     
-    latest_metadata = max(metadata_files, key=lambda x: x.stat().st_mtime)
-    
-    with open(latest_metadata, 'r') as f:
-        proposal_data = json.load(f)
-    
     # Load the actual proposal content
-    proposal_file = Path(proposal_data["file_path"])
-    if proposal_file.exists():
-        with open(proposal_file, 'r') as f:
-            content = f.read()
-        proposal_data["content"] = content
+    try:
+        with open(proposal_data["file_path"], 'r') as f:
+            proposal_data["content"] = f.read()
+    except FileNotFoundError:
+        pass
     
     return proposal_data
 
@@ -2,11 +2,14 @@
 
 from google.adk.agents import LlmAgent
 # Functions will be automatically wrapped as FunctionTools
-import json
-import uuid
+import asyncio
+import orjson
+import gzip
+import secrets
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, List
+from functools import lru_cache
 import os
 import sys
 
@@ -16,41 +19,57 @@ from services.gcs_service import get_gcs_service
 
 MODEL = "gemini-2.0-flash"
 
-def create_opportunity(project_details: Dict[str, Any]) -> Dict[str, Any]:
-    """Create opportunity in mock TeamCentre with GCS or local folder structure."""
-    request_id = f"RFP_{uuid.uuid4().hex[:8].upper()}"
+OPPORTUNITIES_DIR = "teamcentre_mock/opportunities"
+# JSON smaller than this is uploaded uncompressed; gzip framing would eat the savings
+GZIP_MIN_BYTES = 2048
+
+# Logical opportunity subfolders (real directories only on local storage)
+_OPPORTUNITY_FOLDERS = [
+    "documents/uploaded",
+    "documents/processed",
+    "metadata",
+    "proposals",
+    "analysis"
+]
+# Local subdirectories, deduplicated and sorted so parents come first
+_OPPORTUNITY_DIRS = sorted(
+    {str(parent) for folder in _OPPORTUNITY_FOLDERS for parent in Path(folder).parents if str(parent) != "."}
+    | set(_OPPORTUNITY_FOLDERS),
+    key=lambda d: (d.count("/"), d)
+)
+
+def _upload_json(gcs_service, data: dict, gcs_path: str):
+    """Upload a compact JSON document to GCS, gzip-encoded once it is big enough to be worth it."""
+    # No indentation: GCS copies are only read back by code
+    content = orjson.dumps(data)
+    if len(content) < GZIP_MIN_BYTES:
+        gcs_service.upload_file_content(content, gcs_path, "application/json")
+        return
+    # Stored with Content-Encoding: gzip, which GCS transcodes away on download
+    gcs_service.upload_file_content(gzip.compress(content, compresslevel=6), gcs_path, "application/json", "gzip")
+
+def _create_opportunity(project_details: Dict[str, Any]) -> Dict[str, Any]:
+    """Blocking body of create_opportunity."""
+    request_id = f"RFP_{secrets.token_hex(4).upper()}"
+    base = f"{OPPORTUNITIES_DIR}/{request_id}"
     gcs_service = get_gcs_service()
     
     if gcs_service:
-        # Create GCS folder structure by uploading placeholder files
-        folders = [
-            f"teamcentre_mock/opportunities/{request_id}/documents/uploaded/.placeholder",
-            f"teamcentre_mock/opportunities/{request_id}/documents/processed/.placeholder",
-            f"teamcentre_mock/opportunities/{request_id}/metadata/.placeholder",
-            f"teamcentre_mock/opportunities/{request_id}/proposals/.placeholder",
-            f"teamcentre_mock/opportunities/{request_id}/analysis/.placeholder"
-        ]
-        
-        for folder_path in folders:
-            try:
-                gcs_service.upload_file_content(b"# Placeholder file for folder structure", folder_path, "text/plain")
-            except Exception as e:
-                print(f"Warning: Failed to create GCS folder {folder_path}: {e}")
+        folder_path = f"gs://{base}"
+        # GCS has no real folders; the opportunity prefix appears once metadata is written
     else:
         # Create local directory structure
-        base_dir = Path("teamcentre_mock/opportunities")
-        opportunity_dir = base_dir / request_id
-        
-        folders = [
-            "documents/uploaded",
-            "documents/processed",
-            "metadata",
-            "proposals",
-            "analysis"
-        ]
+        folder_path = base
+        opportunity_dir = Path(folder_path)
         
-        for folder in folders:
-            (opportunity_dir / folder).mkdir(parents=True, exist_ok=True)
+        # Create the opportunity root once, then each distinct subdirectory parents-first
+        # with a single mkdir apiece instead of re-walking shared prefixes
+        opportunity_dir.mkdir(parents=True, exist_ok=True)
+        for folder in _OPPORTUNITY_DIRS:
+            try:
+                os.mkdir(opportunity_dir / folder)
+            except FileExistsError:
+                pass
     
     # Create opportunity metadata
     opportunity_data = {
@@ -58,44 +77,45 @@ def create_opportunity(project_details: Dict[str, Any]) -> Dict[str, Any]:
         "project_details": project_details,
         "created_at": datetime.now().isoformat(),
         "status": "created",
-        "folder_structure": folders,
+        "folder_structure": _OPPORTUNITY_FOLDERS,
         "files_uploaded": [],
         "processing_status": "pending"
     }
     
     # Save metadata
     if gcs_service:
-        metadata_path = f"teamcentre_mock/opportunities/{request_id}/metadata/opportunity.json"
-        metadata_content = json.dumps(opportunity_data, indent=2).encode('utf-8')
-        gcs_service.upload_file_content(metadata_content, metadata_path, "application/json")
+        metadata_path = f"{base}/metadata/opportunity.json"
+        _upload_json(gcs_service, opportunity_data, metadata_path)
     else:
         metadata_file = opportunity_dir / "metadata" / "opportunity.json"
-        with open(metadata_file, 'w') as f:
-            json.dump(opportunity_data, f, indent=2)
+        metadata_file.write_bytes(orjson.dumps(opportunity_data, option=orjson.OPT_INDENT_2))
     
     return {
         "request_id": request_id,
         "status": "created",
-        "folder_path": str(opportunity_dir) if not gcs_service else f"gs://teamcentre_mock/opportunities/{request_id}",
+        "folder_path": folder_path,
         "message": f"Opportunity created successfully with Request ID: {request_id}"
     }
 
-def store_uploaded_files(request_id: str, file_info: list[dict]) -> dict:
-    """Store uploaded files metadata in the opportunity folder (GCS or local)."""
+def _store_uploaded_files(request_id: str, file_info: list[dict]) -> dict:
+    """Blocking body of store_uploaded_files."""
+    base = f"{OPPORTUNITIES_DIR}/{request_id}"
+    registry_path = f"{base}/metadata/file_registry.json"
     gcs_service = get_gcs_service()
     
     if gcs_service:
-        # Check if opportunity exists in GCS by looking for metadata placeholder
-        metadata_path = f"teamcentre_mock/opportunities/{request_id}/metadata/.placeholder"
-        if not gcs_service.file_exists(metadata_path):
+        # Check if opportunity exists in GCS via its (cached) metadata
+        try:
+            _load_opportunity(request_id)
+        except FileNotFoundError:
             return {"error": "Opportunity not found", "request_id": request_id}
     else:
         # Local storage check
-        opportunity_dir = Path("teamcentre_mock/opportunities") / request_id
-        if not opportunity_dir.exists():
+        if not os.path.isdir(base):
             return {"error": "Opportunity not found", "request_id": request_id}
     
     uploaded_files = []
+    now_iso = datetime.now().isoformat()
     
     for file_data in file_info:
         try:
@@ -108,7 +128,7 @@ def store_uploaded_files(request_id: str, file_info: list[dict]) -> dict:
                 "filename": filename,
                 "file_url": file_url,
                 "file_size": file_size,
-                "upload_time": datetime.now().isoformat(),
+                "upload_time": now_iso,
                 "status": "uploaded",
                 "request_id": request_id,
                 "storage_type": "gcs" if gcs_service else "local"
@@ -124,20 +144,19 @@ def store_uploaded_files(request_id: str, file_info: list[dict]) -> dict:
         "request_id": request_id,
         "uploaded_files": uploaded_files,
         "total_files": len(uploaded_files),
-        "last_updated": datetime.now().isoformat()
+        "last_updated": now_iso
     }
     
     if gcs_service:
         # Store registry in GCS
-        registry_path = f"teamcentre_mock/opportunities/{request_id}/metadata/file_registry.json"
-        registry_content = json.dumps(registry_data, indent=2).encode('utf-8')
-        gcs_service.upload_file_content(registry_content, registry_path, "application/json")
+        _upload_json(gcs_service, registry_data, registry_path)
     else:
         # Store registry locally
-        opportunity_dir = Path("teamcentre_mock/opportunities") / request_id
-        registry_file = opportunity_dir / "metadata" / "file_registry.json"
-        with open(registry_file, "w") as f:
-            json.dump(registry_data, f, indent=2)
+        # Write beside the target and rename so readers never see a half-written registry
+        tmp_file = f"{registry_path}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(orjson.dumps(registry_data, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_file, registry_path)
     
     return {
         "request_id": request_id,
@@ -146,34 +165,47 @@ def store_uploaded_files(request_id: str, file_info: list[dict]) -> dict:
         "status": "success"
     }
 
-def get_opportunity_status(request_id: str) -> dict:
-    """Get current status of an opportunity from GCS or local storage."""
+@lru_cache(maxsize=256)
+def _load_opportunity(request_id: str) -> dict:
+    """Decoded opportunity metadata, cached since it is only written at creation.
+    
+    Raises FileNotFoundError if the opportunity doesn't exist (misses are not cached).
+    """
+    metadata_path = f"{OPPORTUNITIES_DIR}/{request_id}/metadata/opportunity.json"
     gcs_service = get_gcs_service()
     
     if gcs_service:
-        # Get from GCS
-        metadata_path = f"teamcentre_mock/opportunities/{request_id}/metadata/opportunity.json"
-        try:
-            content = gcs_service.get_file_content(metadata_path)
-            if content:
-                opportunity_data = json.loads(content.decode('utf-8'))
-                return opportunity_data
-            else:
-                return {"error": "Opportunity not found", "request_id": request_id}
-        except Exception as e:
-            return {"error": f"Failed to retrieve opportunity: {str(e)}", "request_id": request_id}
-    else:
-        # Get from local storage
-        opportunity_dir = Path("teamcentre_mock/opportunities") / request_id
-        metadata_file = opportunity_dir / "metadata" / "opportunity.json"
-        
-        if not metadata_file.exists():
-            return {"error": "Opportunity not found", "request_id": request_id}
-        
-        with open(metadata_file, "r") as f:
-            opportunity_data = json.load(f)
-        
-        return opportunity_data
+        content = gcs_service.get_file_content(metadata_path)
+        if not content:
+            raise FileNotFoundError(metadata_path)
+        return orjson.loads(content)
+    
+    # Whole-file read, so skip the BufferedReader layer
+    with open(metadata_path, "rb", buffering=0) as f:
+        return orjson.loads(f.read())
+
+def _get_opportunity_status(request_id: str) -> dict:
+    """Blocking body of get_opportunity_status."""
+    try:
+        # Copy so the tool result can't mutate the cached metadata
+        return dict(_load_opportunity(request_id))
+    except FileNotFoundError:
+        return {"error": "Opportunity not found", "request_id": request_id}
+    except Exception as e:
+        return {"error": f"Failed to retrieve opportunity: {str(e)}", "request_id": request_id}
+
+# Agent tools: storage calls are blocking, so run them off the agent's event loop
+async def create_opportunity(project_details: Dict[str, Any]) -> Dict[str, Any]:
+    """Create opportunity in mock TeamCentre with GCS or local folder structure."""
+    return await asyncio.to_thread(_create_opportunity, project_details)
+
+async def store_uploaded_files(request_id: str, file_info: list[dict]) -> dict:
+    """Store uploaded files metadata in the opportunity folder (GCS or local)."""
+    return await asyncio.to_thread(_store_uploaded_files, request_id, file_info)
+
+async def get_opportunity_status(request_id: str) -> dict:
+    """Get current status of an opportunity from GCS or local storage."""
+    return await asyncio.to_thread(_get_opportunity_status, request_id)
 
 teamcentre_mock_agent = LlmAgent(
     name="teamcentre_mock",
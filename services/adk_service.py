@@ -1,85 +1,284 @@
 """ADK Integration Service for managing ADK API server interactions."""
 
 import httpx
-import json
+import orjson
 import uuid
 import os
-from typing import Dict, List, Any, Optional, AsyncGenerator
+from pathlib import Path
+from typing import Dict, List, Any, Optional, AsyncGenerator, Awaitable, Callable
 from datetime import datetime
 import asyncio
+import copy
+import functools
+import hashlib
 import logging
+import time
+import mimetypes
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+try:
+    import google.generativeai as genai
+except ImportError:
+    logger.warning("google-generativeai not installed; attachments will be sent as text references")
+    genai = None
+else:
+    # Configure Gemini API for file uploads once, not per message
+    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+    if GOOGLE_API_KEY:
+        genai.configure(api_key=GOOGLE_API_KEY)
+
+AGENT_RUN_TIMEOUT = 120.0  # seconds; agent runs can take much longer than session calls
+ADK_KEEPALIVE_CONNECTIONS = 32
+GENAI_FILE_TTL = 47 * 3600  # seconds; Gemini Files API uploads expire after 48h
+UPLOAD_CACHE_SIZE = 512
+ATTACHMENT_UPLOAD_CONCURRENCY = 8  # parallel Gemini file uploads per message
+# Seconds an identical (user, session, message) submit replays the previous turn's result.
+# Kept short: a user may legitimately repeat a message ("yes") on a later turn.
+RUN_REPLAY_WINDOW = 10.0
+RUN_CACHE_SIZE = 1024
+
+@functools.lru_cache(maxsize=512)
+def _mime_type_for_suffix(suffix: str) -> str:
+    """Resolve a file extension to a MIME type, cached per extension."""
+    if not mimetypes.inited:
+        mimetypes.init()
+    return mimetypes.types_map.get(suffix, "application/octet-stream")
+
+FALLBACK_RESPONSE_TEXT = "I apologize, but I encountered an issue processing your request. Please try again."
+
+def _model_parts_text(content: Dict):
+    """Yield the text of each part of a model-authored content block."""
+    for part in content.get("parts", []):
+        if isinstance(part, str):
+            yield part
+        elif isinstance(part, dict) and "text" in part:
+            yield part["text"]
+
+def _iter_response_text(events: List[Dict]):
+    """Yield response text fragments from ADK events in a single pass."""
+    for event in events:
+        # Handle different event structures
+        if not isinstance(event, dict):
+            continue
+        # Check for direct content
+        content = event.get("content", {})
+        if content.get("role") == "model":
+            yield from _model_parts_text(content)
+        # Check for nested event structure
+        elif "event" in event:
+            nested_content = event["event"].get("content", {})
+            if nested_content.get("role") == "model":
+                yield from _model_parts_text(nested_content)
+        # Check for direct text field
+        elif "text" in event:
+            yield event["text"]
+        # Check for response field (common in ADK responses)
+        elif "response" in event:
+            yield str(event["response"])
+        # Check for message field
+        elif "message" in event:
+            yield str(event["message"])
+
+async def _aiter_byte_lines(response):
+    """Split a streamed response body into lines without decoding it to str."""
+    buf = bytearray()
+    async for chunk in response.aiter_bytes():
+        buf += chunk
+        start = 0
+        while (nl := buf.find(b"\n", start)) != -1:
+            yield bytes(buf[start:nl]).rstrip(b"\r")
+            start = nl + 1
+        del buf[:start]
+    if buf:
+        yield bytes(buf)
+
 class ADKService:
     """Service for interacting with ADK API server endpoints."""
     
     def __init__(self, adk_base_url: str = "http://localhost:8000", app_name: str = "academic-research"):
         self.base_url = adk_base_url
         self.app_name = app_name
+        # Session path relative to the client's base_url, with the app bound once
+        self._session_path_tpl = f"/apps/{app_name}/users/{{user_id}}/sessions/{{session_id}}"
+        # Shared client so calls reuse pooled keep-alive connections to the ADK server
+        self._client: Optional[httpx.AsyncClient] = None
+        # (path, size, mtime_ns) -> (file_uri, mime_type, expires_at) for Gemini file uploads, LRU order
+        self._upload_cache: OrderedDict = OrderedDict()
+        # Duplicate-submit handling for run_turn_once: key -> in-flight task / (expires_at, result)
+        self._inflight_runs: Dict[bytes, asyncio.Future] = {}
+        self._recent_runs: OrderedDict = OrderedDict()
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating it on first use."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(max_keepalive_connections=ADK_KEEPALIVE_CONNECTIONS)
+            )
+        return self._client
+    
+    async def aclose(self):
+        """Close the shared HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _upload_attachment(self, file_path: Path, st: os.stat_result) -> tuple[str, str]:
+        """Upload a file to the Gemini Files API, reusing a recent upload of the same unchanged file."""
+        if genai is None:
+            raise RuntimeError("google-generativeai is not installed")
         
-    async def list_available_agents(self) -> List[str]:
-        """Get list of available ADK agents."""
-        async with httpx.AsyncClient() as client:
+        key = (str(file_path), st.st_size, st.st_mtime_ns)
+        now = time.monotonic()
+        cached = self._upload_cache.get(key)
+        if cached and cached[2] > now:
+            self._upload_cache.move_to_end(key)
+            return cached[0], cached[1]
+        
+        # The SDK upload is blocking, so keep it off the event loop
+        uploaded_file = await asyncio.to_thread(genai.upload_file, str(file_path))
+        self._upload_cache[key] = (uploaded_file.uri, uploaded_file.mime_type, now + GENAI_FILE_TTL)
+        self._upload_cache.move_to_end(key)
+        if len(self._upload_cache) > UPLOAD_CACHE_SIZE:
+            self._upload_cache.popitem(last=False)
+        return uploaded_file.uri, uploaded_file.mime_type
+    
+    async def _prepare_attachment_parts(self, attachments: list) -> List[Dict]:
+        """Upload attachments concurrently and return their message parts, in attachment order."""
+        semaphore = asyncio.Semaphore(ATTACHMENT_UPLOAD_CONCURRENCY)
+        
+        async def prepare_one(attachment_url: str) -> Optional[Dict]:
             try:
-                response = await client.get(f"{self.base_url}/list-apps")
-                response.raise_for_status()
-                return response.json()
+                # Convert URL to file path
+                file_path = Path(attachment_url.replace("/uploads/", "uploads/"))
+                try:
+                    st = await asyncio.to_thread(file_path.stat)
+                except FileNotFoundError:
+                    return None
+                
+                # Upload file to Google API to get proper URI (reusing a still-valid earlier upload)
+                async with semaphore:
+                    file_uri, mime_type = await self._upload_attachment(file_path, st)
+                
+                logger.info(f"Uploaded file to Google API: {file_uri}")
+                logger.info(f"File name: {file_path.name}, MIME type: {mime_type}")
+                
+                # Add file as attachment part using proper ADK format
+                return {
+                    "file_data": {
+                        "file_uri": file_uri,
+                        "mime_type": mime_type
+                    }
+                }
+                
             except Exception as e:
-                logger.error(f"Failed to list agents: {e}")
-                return []
+                logger.error(f"Error processing attachment {attachment_url}: {str(e)}")
+                # Add as text reference if file processing fails
+                return {"text": f"\n[Attachment: {Path(attachment_url).name}]"}
+        
+        # A URL repeated within one message is uploaded and attached once (first occurrence keeps its place)
+        parts = await asyncio.gather(*(prepare_one(url) for url in dict.fromkeys(attachments)))
+        return [part for part in parts if part is not None]
+    
+    async def list_available_agents(self) -> List[str]:
+        """Get list of available ADK agents."""
+        client = self._get_client()
+        try:
+            response = await client.get("/list-apps")
+            response.raise_for_status()
+            return orjson.loads(response.content)
+        except Exception as e:
+            logger.error(f"Failed to list agents: {e}")
+            return []
     
     async def create_session(self, user_id: str, session_id: str, initial_state: Optional[Dict] = None) -> Dict:
         """Create or update an ADK session."""
-        url = f"{self.base_url}/apps/{self.app_name}/users/{user_id}/sessions/{session_id}"
+        url = self._session_path_tpl.format(user_id=user_id, session_id=session_id)
         
         payload = {
             "state": initial_state or {}
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    url,
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                response.raise_for_status()
-                return response.json()
-            except Exception as e:
-                logger.error(f"Failed to create session: {e}")
-                raise
+        client = self._get_client()
+        try:
+            response = await client.post(
+                url,
+                content=orjson.dumps(payload),
+                headers={"Content-Type": "application/json"}
+            )
+            response.raise_for_status()
+            return orjson.loads(response.content)
+        except Exception as e:
+            logger.error(f"Failed to create session: {e}")
+            raise
     
     async def get_session(self, user_id: str, session_id: str) -> Optional[Dict]:
         """Get session details including state and events."""
-        url = f"{self.base_url}/apps/{self.app_name}/users/{user_id}/sessions/{session_id}"
+        url = self._session_path_tpl.format(user_id=user_id, session_id=session_id)
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url)
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 404:
-                    return None
-                logger.error(f"Failed to get session: {e}")
-                raise
-            except Exception as e:
-                logger.error(f"Failed to get session: {e}")
-                raise
+        client = self._get_client()
+        try:
+            response = await client.get(url)
+            response.raise_for_status()
+            return orjson.loads(response.content)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            logger.error(f"Failed to get session: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Failed to get session: {e}")
+            raise
     
     async def delete_session(self, user_id: str, session_id: str) -> bool:
         """Delete a session and all associated data."""
-        url = f"{self.base_url}/apps/{self.app_name}/users/{user_id}/sessions/{session_id}"
+        url = self._session_path_tpl.format(user_id=user_id, session_id=session_id)
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.delete(url)
-                response.raise_for_status()
-                return True
-            except Exception as e:
-                logger.error(f"Failed to delete session: {e}")
-                return False
+        client = self._get_client()
+        try:
+            response = await client.delete(url)
+            response.raise_for_status()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to delete session: {e}")
+            return False
+    
+    async def run_turn_once(self, user_id: str, session_id: str, message: str, attachments: list,
+                            handle_turn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """Run `handle_turn()` once for identical submits (double-clicks, client retries).
+        
+        Returns (result, replayed). A replayed caller joined an identical turn in flight, or one
+        answered within RUN_REPLAY_WINDOW, and must not persist anything itself. Each caller
+        gets its own shallow copy of the result.
+        """
+        key = hashlib.blake2b(
+            f"{user_id}|{session_id}|{message}|{sorted(attachments or [])}".encode(), digest_size=16
+        ).digest()
+        recent = self._recent_runs.get(key)
+        if recent and recent[0] > time.monotonic():
+            self._recent_runs.move_to_end(key)
+            return copy.copy(recent[1]), True
+        
+        run = self._inflight_runs.get(key)
+        replayed = run is not None
+        if run is None:
+            run = asyncio.ensure_future(handle_turn())
+            self._inflight_runs[key] = run
+            run.add_done_callback(functools.partial(self._finish_run, key))
+        # Shield so one caller disconnecting doesn't cancel the turn for the others
+        return copy.copy(await asyncio.shield(run)), replayed
+    
+    def _finish_run(self, key: bytes, run: asyncio.Future):
+        """Remember a successful turn briefly so an immediate replay gets the same result."""
+        self._inflight_runs.pop(key, None)
+        if run.cancelled() or run.exception() is not None:
+            return
+        self._recent_runs[key] = (time.monotonic() + RUN_REPLAY_WINDOW, run.result())
+        self._recent_runs.move_to_end(key)
+        if len(self._recent_runs) > RUN_CACHE_SIZE:
+            self._recent_runs.popitem(last=False)
     
     async def run_agent(self, user_id: str, session_id: str, message: str, attachments: list = None) -> List[Dict]:
         """Run agent and get all events at once."""
@@ -88,37 +287,7 @@ class ADKService:
         
         # Process attachments if provided
         if attachments:
-            import google.generativeai as genai
-            
-            # Configure Gemini API for file uploads
-            GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-            if GOOGLE_API_KEY:
-                genai.configure(api_key=GOOGLE_API_KEY)
-            
-            for attachment_url in attachments:
-                try:
-                    # Convert URL to file path
-                    file_path = attachment_url.replace("/uploads/", "uploads/")
-                    if os.path.exists(file_path):
-                        # Upload file to Google API to get proper URI
-                        uploaded_file = genai.upload_file(file_path)
-                        
-                        # Add file as attachment part using proper ADK format
-                        message_parts.append({
-                            "file_data": {
-                                "file_uri": uploaded_file.uri,
-                                "mime_type": uploaded_file.mime_type
-                            }
-                        })
-                        
-                        logger.info(f"Uploaded file to Google API: {uploaded_file.uri}")
-                        logger.info(f"File name: {uploaded_file.name}, MIME type: {uploaded_file.mime_type}")
-                        logger.info(f"Message parts now: {message_parts}")
-                        
-                except Exception as e:
-                    logger.error(f"Error processing attachment {attachment_url}: {str(e)}")
-                    # Add as text reference if file processing fails
-                    message_parts.append({"text": f"\n[Attachment: {os.path.basename(attachment_url)}]"})
+            message_parts.extend(await self._prepare_attachment_parts(attachments))
         
         # Use proper ADK Content object format
         payload = {
@@ -131,42 +300,43 @@ class ADKService:
             }
         }
         
-        logger.info(f"Sending payload to ADK: {payload}")
+        logger.info(f"Sending run to ADK: user={user_id}, session={session_id}, parts={len(message_parts)}")
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}/run",
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                response.raise_for_status()
-                result = response.json()
+        client = self._get_client()
+        try:
+            response = await client.post(
+                "/run",
+                content=orjson.dumps(payload),
+                headers={"Content-Type": "application/json"},
+                timeout=AGENT_RUN_TIMEOUT
+            )
+            response.raise_for_status()
+            result = orjson.loads(response.content)
+            
+            # Ensure we return a list of events
+            if isinstance(result, dict):
+                return [result]
+            elif isinstance(result, list):
+                return result
+            else:
+                logger.warning(f"Unexpected response format: {type(result)}")
+                return []
                 
-                # Ensure we return a list of events
-                if isinstance(result, dict):
-                    return [result]
-                elif isinstance(result, list):
-                    return result
-                else:
-                    logger.warning(f"Unexpected response format: {type(result)}")
-                    return []
-                    
-            except httpx.HTTPStatusError as e:
-                logger.error(f"ADK HTTP error: {e.response.status_code} - {e.response.text}")
-                # Check if ADK server is not running
-                if e.response.status_code == 404:
-                    raise Exception("ADK server not found. Please start the ADK server with: python -m google.adk.agents.server --app academic-research --port 8000")
-                raise Exception(f"ADK server error: {e.response.status_code} - {e.response.text}")
-            except httpx.ConnectError as e:
-                logger.error(f"ADK connection error: {e}")
-                raise Exception("Cannot connect to ADK server. Please ensure the ADK server is running on port 8000")
-            except httpx.RequestError as e:
-                logger.error(f"ADK request error: {e}")
-                raise Exception(f"ADK request failed: {str(e)}")
-            except Exception as e:
-                logger.error(f"Failed to run agent: {e}")
-                raise Exception(f"ADK service error: {str(e)}")
+        except httpx.HTTPStatusError as e:
+            logger.error(f"ADK HTTP error: {e.response.status_code} - {e.response.text}")
+            # Check if ADK server is not running
+            if e.response.status_code == 404:
+                raise Exception("ADK server not found. Please start the ADK server with: python -m google.adk.agents.server --app academic-research --port 8000")
+            raise Exception(f"ADK server error: {e.response.status_code} - {e.response.text}")
+        except httpx.ConnectError as e:
+            logger.error(f"ADK connection error: {e}")
+            raise Exception("Cannot connect to ADK server. Please ensure the ADK server is running on port 8000")
+        except httpx.RequestError as e:
+            logger.error(f"ADK request error: {e}")
+            raise Exception(f"ADK request failed: {str(e)}")
+        except Exception as e:
+            logger.error(f"Failed to run agent: {e}")
+            raise Exception(f"ADK service error: {str(e)}")
     
     async def run_agent_streaming(self, user_id: str, session_id: str, message: str, streaming: bool = True, attachments: list = None) -> AsyncGenerator[Dict, None]:
         """Run agent with streaming response using ADK's native streaming."""
@@ -175,35 +345,7 @@ class ADKService:
         
         # Process attachments if provided
         if attachments:
-            import google.generativeai as genai
-            
-            # Configure Gemini API for file uploads
-            GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-            if GOOGLE_API_KEY:
-                genai.configure(api_key=GOOGLE_API_KEY)
-            
-            for attachment_url in attachments:
-                try:
-                    # Convert URL to file path
-                    file_path = attachment_url.replace("/uploads/", "uploads/")
-                    if os.path.exists(file_path):
-                        # Upload file to Google API to get proper URI
-                        uploaded_file = genai.upload_file(file_path)
-                        
-                        # Add file as attachment part using proper ADK format
-                        message_parts.append({
-                            "file_data": {
-                                "file_uri": uploaded_file.uri,
-                                "mime_type": uploaded_file.mime_type
-                            }
-                        })
-                        
-                        logger.info(f"Uploaded file to Google API: {uploaded_file.uri}")
-                        
-                except Exception as e:
-                    logger.error(f"Error processing attachment {attachment_url}: {str(e)}")
-                    # Add as text reference if file processing fails
-                    message_parts.append({"text": f"\n[Attachment: {os.path.basename(attachment_url)}]"})
+            message_parts.extend(await self._prepare_attachment_parts(attachments))
         
         payload = {
             "app_name": self.app_name,
@@ -215,67 +357,71 @@ class ADKService:
             }
         }
         
-        logger.info(f"Sending streaming payload to ADK: {payload}")
+        logger.info(f"Sending streaming run to ADK: user={user_id}, session={session_id}, parts={len(message_parts)}")
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            try:
-                # Use the standard /run endpoint with streaming
-                async with client.stream(
-                    "POST",
-                    f"{self.base_url}/run",
-                    json=payload,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Accept": "text/event-stream"
-                    }
-                ) as response:
-                    response.raise_for_status()
-                    
-                    async for line in response.aiter_lines():
-                        if line.strip():
+        client = self._get_client()
+        try:
+            # Use the standard /run endpoint with streaming
+            async with client.stream(
+                "POST",
+                "/run",
+                content=orjson.dumps(payload),
+                headers={
+                    "Content-Type": "application/json",
+                    "Accept": "text/event-stream"
+                },
+                timeout=AGENT_RUN_TIMEOUT
+            ) as response:
+                response.raise_for_status()
+                # Checked once so per-line debug messages aren't formatted when discarded
+                debug = logger.isEnabledFor(logging.DEBUG)
+                
+                async for line in _aiter_byte_lines(response):
+                    if line.strip():
+                        if debug:
                             logger.debug(f"ADK streaming line: {line}")
-                            if line.startswith("data: "):
-                                try:
-                                    event_data = json.loads(line[6:])  # Remove "data: " prefix
-                                    logger.debug(f"ADK streaming event: {json.dumps(event_data, indent=2)}")
-                                    yield event_data
-                                except json.JSONDecodeError as e:
-                                    logger.warning(f"Failed to parse streaming data: {line}, error: {e}")
-                                    continue
-                            elif line.startswith("event: "):
-                                # Handle event type lines
-                                logger.debug(f"ADK event type: {line}")
+                        if line.startswith(b"data: "):
+                            try:
+                                event_data = orjson.loads(line[6:])  # Remove "data: " prefix
+                                yield event_data
+                            except orjson.JSONDecodeError as e:
+                                logger.warning(f"Failed to parse streaming data: {line}, error: {e}")
                                 continue
-                            else:
-                                # Try to parse as direct JSON
-                                try:
-                                    event_data = json.loads(line)
-                                    logger.debug(f"ADK direct JSON event: {json.dumps(event_data, indent=2)}")
-                                    yield event_data
-                                except json.JSONDecodeError:
+                        elif line.startswith(b"event: "):
+                            # Handle event type lines
+                            if debug:
+                                logger.debug(f"ADK event type: {line}")
+                            continue
+                        else:
+                            # Try to parse as direct JSON
+                            try:
+                                event_data = orjson.loads(line)
+                                yield event_data
+                            except orjson.JSONDecodeError:
+                                if debug:
                                     logger.debug(f"Non-JSON line: {line}")
-                                    continue
-                                    
-            except httpx.HTTPStatusError as e:
-                logger.error(f"ADK streaming HTTP error: {e.response.status_code} - {e.response.text}")
-                if e.response.status_code == 404:
-                    # Fallback to non-streaming if streaming not supported
-                    logger.info("Streaming not supported, falling back to regular run")
-                    events = await self.run_agent(user_id, session_id, message, attachments)
-                    for event in events:
-                        yield event
-                else:
-                    raise Exception(f"ADK streaming error: {e.response.status_code} - {e.response.text}")
-            except httpx.ConnectError as e:
-                logger.error(f"ADK connection error: {e}")
-                raise Exception("Cannot connect to ADK server. Please ensure the ADK server is running on port 8000")
-            except Exception as e:
-                logger.error(f"Failed to run streaming agent: {e}")
-                # Fallback to non-streaming
-                logger.info("Streaming failed, falling back to regular run")
+                                continue
+                                
+        except httpx.HTTPStatusError as e:
+            logger.error(f"ADK streaming HTTP error: {e.response.status_code} - {e.response.text}")
+            if e.response.status_code == 404:
+                # Fallback to non-streaming if streaming not supported
+                logger.info("Streaming not supported, falling back to regular run")
                 events = await self.run_agent(user_id, session_id, message, attachments)
                 for event in events:
                     yield event
+            else:
+                raise Exception(f"ADK streaming error: {e.response.status_code} - {e.response.text}")
+        except httpx.ConnectError as e:
+            logger.error(f"ADK connection error: {e}")
+            raise Exception("Cannot connect to ADK server. Please ensure the ADK server is running on port 8000")
+        except Exception as e:
+            logger.error(f"Failed to run streaming agent: {e}")
+            # Fallback to non-streaming
+            logger.info("Streaming failed, falling back to regular run")
+            events = await self.run_agent(user_id, session_id, message, attachments)
+            for event in events:
+                yield event
     
     def generate_session_id(self) -> str:
         """Generate a unique session ID."""
@@ -283,59 +429,25 @@ class ADKService:
     
     def extract_response_text(self, events: List[Dict]) -> str:
         """Extract the final response text from ADK events."""
-        response_parts = []
-        
-        for event in events:
-            # Handle different event structures
-            if isinstance(event, dict):
-                # Check for direct content
-                content = event.get("content", {})
-                if content.get("role") == "model":
-                    parts = content.get("parts", [])
-                    for part in parts:
-                        if isinstance(part, dict) and "text" in part:
-                            response_parts.append(part["text"])
-                        elif isinstance(part, str):
-                            response_parts.append(part)
-                
-                # Check for nested event structure
-                elif "event" in event:
-                    nested_content = event["event"].get("content", {})
-                    if nested_content.get("role") == "model":
-                        parts = nested_content.get("parts", [])
-                        for part in parts:
-                            if isinstance(part, dict) and "text" in part:
-                                response_parts.append(part["text"])
-                            elif isinstance(part, str):
-                                response_parts.append(part)
-                
-                # Check for direct text field
-                elif "text" in event:
-                    response_parts.append(event["text"])
-                
-                # Check for response field (common in ADK responses)
-                elif "response" in event:
-                    response_parts.append(str(event["response"]))
-                
-                # Check for message field
-                elif "message" in event:
-                    response_parts.append(str(event["message"]))
-        
-        result = "".join(response_parts).strip()
+        result = "".join(_iter_response_text(events)).strip()
         
         # If no text found, return a helpful message
         if not result:
             logger.warning(f"No response text found in events: {events}")
             # Log the full event structure for debugging
-            logger.debug(f"Full events for debugging: {json.dumps(events, indent=2)}")
-            return "I apologize, but I encountered an issue processing your request. Please try again."
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Full events for debugging: {orjson.dumps(events, option=orjson.OPT_INDENT_2, default=str).decode()}")
+            return FALLBACK_RESPONSE_TEXT
         
         return result
     
     async def get_or_create_session(self, user_id: str, session_id: str = None) -> tuple[str, Dict]:
         """Get existing session or create new one."""
         if not session_id:
+            # A freshly generated id can't exist yet, so skip the lookup round-trip
             session_id = str(uuid.uuid4())
+            session_data = await self.create_session(user_id, session_id)
+            return session_id, session_data
         
         # Try to get existing session first
         try:
@@ -351,6 +463,4 @@ class ADKService:
     
     def _get_mime_type(self, file_path: str) -> str:
         """Get MIME type for a file."""
-        import mimetypes
-        mime_type, _ = mimetypes.guess_type(file_path)
-        return mime_type or "application/octet-stream"
+        return _mime_type_for_suffix(Path(file_path).suffix.lower())
@@ -1,32 +1,56 @@
 import jwt
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
+from collections import OrderedDict
+import hashlib
 import os
+import time
 from fastapi import HTTPException, status
 import firebase_admin
 from firebase_admin import auth
 
+VERIFY_CACHE_TTL = 300  # seconds a verified token is trusted before re-verifying
+VERIFY_CACHE_SIZE = 8192
+
 class AuthService:
     def __init__(self):
         self.secret_key = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
         self.algorithm = "HS256"
         self.access_token_expire_minutes = 60 * 24  # 24 hours
+        # sha256(token) -> (expires_at, user info); clients resend the same token on every request
+        self._verify_cache: OrderedDict[bytes, Tuple[float, Dict[str, Any]]] = OrderedDict()
 
     async def verify_token(self, token: str) -> Dict[str, Any]:
         """Verify JWT token or Firebase ID token"""
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        cached = self._verify_cache.get(key)
+        if cached:
+            if cached[0] > now:
+                self._verify_cache.move_to_end(key)
+                return dict(cached[1])
+            del self._verify_cache[key]
+        
         try:
             # Try Firebase ID token first
             if self._is_firebase_token(token):
-                return await self._verify_firebase_token(token)
+                user, exp = await self._verify_firebase_token(token)
             else:
                 # Try JWT token
-                return await self._verify_jwt_token(token)
+                user, exp = await self._verify_jwt_token(token)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication token",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        
+        # Never trust a cached result past the token's own expiry; tokens without one aren't cached
+        if exp is not None:
+            self._verify_cache[key] = (min(now + VERIFY_CACHE_TTL, exp), user)
+            if len(self._verify_cache) > VERIFY_CACHE_SIZE:
+                self._verify_cache.popitem(last=False)
+        return dict(user)
 
     def _is_firebase_token(self, token: str) -> bool:
         """Check if token looks like a Firebase ID token"""
@@ -34,8 +58,8 @@ class AuthService:
         parts = token.split('.')
         return len(parts) == 3 and len(token) > 500
 
-    async def _verify_firebase_token(self, token: str) -> Dict[str, Any]:
-        """Verify Firebase ID token"""
+    async def _verify_firebase_token(self, token: str) -> Tuple[Dict[str, Any], Optional[float]]:
+        """Verify Firebase ID token, returning (user info, exp)"""
         try:
             decoded_token = auth.verify_id_token(token)
             return {
@@ -44,15 +68,15 @@ class AuthService:
                 "name": decoded_token.get("name"),
                 "picture": decoded_token.get("picture"),
                 "provider": "firebase"
-            }
+            }, decoded_token.get("exp")
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid Firebase token"
             )
 
-    async def _verify_jwt_token(self, token: str) -> Dict[str, Any]:
-        """Verify custom JWT token"""
+    async def _verify_jwt_token(self, token: str) -> Tuple[Dict[str, Any], Optional[float]]:
+        """Verify custom JWT token, returning (user info, exp)"""
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
             user_id: str = payload.get("sub")
@@ -66,7 +90,7 @@ class AuthService:
                 "email": payload.get("email"),
                 "name": payload.get("name"),
                 "provider": "jwt"
-            }
+            }, payload.get("exp")
         except jwt.ExpiredSignatureError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
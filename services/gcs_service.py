@@ -13,6 +13,7 @@ import mimetypes
 try:
     from google.cloud import storage
     from google.oauth2 import service_account
+    from requests.adapters import HTTPAdapter
 except ImportError:
     print("❌ Missing GCS dependencies. Install with: pip install google-cloud-storage")
     storage = None
@@ -41,7 +42,14 @@ class GCSService:
             client = storage.Client()
             print("🔑 Using Application Default Credentials (ADC)")
             
-            # Test connection
+            # Keep enough pooled connections for concurrent requests
+            adapter = HTTPAdapter(
+                pool_connections=GCS_CONFIG["http_pool_connections"],
+                pool_maxsize=GCS_CONFIG["http_pool_maxsize"]
+            )
+            client._http.mount("https://", adapter)
+            
+            # Test connection (also opens the first pooled connection)
             client.get_bucket(self.bucket_name)
             print(f"✅ Connected to GCS bucket: {self.bucket_name}")
             return client
@@ -72,10 +80,14 @@ class GCSService:
             print(f"❌ Failed to upload {file_path} to GCS: {e}")
             raise
     
-    def upload_file_content(self, content: bytes, gcs_path: str, content_type: str = None) -> str:
+    def upload_file_content(self, content: bytes, gcs_path: str, content_type: str = None,
+                            content_encoding: str = None) -> str:
         """Upload file content directly to GCS."""
         try:
             blob = self.bucket.blob(gcs_path)
+            if content_encoding:
+                # e.g. "gzip": GCS transcodes back to plain bytes for readers
+                blob.content_encoding = content_encoding
             blob.upload_from_string(content, content_type=content_type or 'application/octet-stream')
             
             return f"gs://{self.bucket_name}/{gcs_path}"
@@ -84,6 +96,22 @@ class GCSService:
             print(f"❌ Failed to upload content to GCS: {e}")
             raise
     
+    def upload_file_stream(self, file_obj, gcs_path: str, content_type: str = None) -> tuple[str, int]:
+        """Upload a file-like object to GCS in chunks without reading it into memory.
+        
+        Returns the gs:// URL and the number of bytes stored.
+        """
+        try:
+            blob = self.bucket.blob(gcs_path, chunk_size=GCS_CONFIG["upload_chunk_size"])
+            blob.upload_from_file(file_obj, content_type=content_type or 'application/octet-stream')
+            
+            # blob.size comes from the object resource GCS returns for the finished upload
+            return f"gs://{self.bucket_name}/{gcs_path}", blob.size
+            
+        except Exception as e:
+            print(f"❌ Failed to stream upload to GCS: {e}")
+            raise
+    
     def download_file(self, gcs_path: str, local_path: str) -> bool:
         """Download a file from GCS to local path."""
         try:
@@ -223,7 +223,7 @@ def generate_local_response(user_input, attachments=None):
 def get_conversation_details(conversation_id):
     """Get conversation with messages"""
     try:
-        response = requests.get(f"{BACKEND_URL}/conversations/{conversation_id}", headers=headers)
+        response = requests.get(f"{BACKEND_URL}/conversations/{conversation_id}", headers=headers, params={"include_messages": "true"})
         if response.status_code == 200:
             return response.json()
         return None
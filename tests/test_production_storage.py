@@ -0,0 +1,124 @@
+"""Tests for ProductionStorage serialization of Firestore documents."""
+
+import os
+import sys
+import unittest
+from datetime import datetime, timezone
+
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import production_storage
+from production_storage import ProductionStorage
+
+try:
+    from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+except ImportError:
+    # Same shape as the real class: a datetime subclass, which orjson refuses to serialize
+    class DatetimeWithNanoseconds(datetime):
+        pass
+
+
+def _firestore_docs():
+    return [
+        {"id": "msg_1", "role": "user", "content": "hi",
+         "timestamp": DatetimeWithNanoseconds(2024, 1, 2, 3, 4, 5, 6, tzinfo=timezone.utc)},
+        {"id": "msg_2", "role": "assistant", "content": "hello",
+         "timestamp": DatetimeWithNanoseconds(2024, 1, 2, 3, 4, 6, tzinfo=timezone.utc)},
+    ]
+
+
+class _FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket, self.name = bucket, name
+        self.content_encoding = None
+        self.generation = 1
+        self.component_count = 1
+
+    def reload(self):
+        if self.name not in self.bucket.objects:
+            raise production_storage.NotFound("missing")
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None):
+        self.bucket.objects[self.name] = data
+
+    def download_as_bytes(self, raw_download=False):
+        if self.name not in self.bucket.objects:
+            raise production_storage.NotFound("missing")
+        return self.bucket.objects[self.name]
+
+
+class _FakeBucket:
+    def __init__(self):
+        self.objects = {}
+
+    def blob(self, name):
+        return _FakeBlob(self, name)
+
+
+class _FakeQuery:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def where(self, *args):
+        return self
+
+    def order_by(self, *args):
+        return self
+
+    def stream(self):
+        for doc in self.docs:
+            yield type("Snapshot", (), {"to_dict": lambda self, doc=doc: dict(doc)})()
+
+
+class _FakeFirestore:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def collection(self, name):
+        return _FakeQuery(self.docs)
+
+
+def _storage(docs):
+    storage = ProductionStorage.__new__(ProductionStorage)
+    storage.bucket = _FakeBucket()
+    storage.firestore_client = _FakeFirestore(docs)
+    return storage
+
+
+class LogLinesTest(unittest.TestCase):
+    def test_datetime_with_nanoseconds_is_serialized_as_naive_utc(self):
+        lines = ProductionStorage._log_lines(_firestore_docs()).splitlines()
+        self.assertEqual([orjson.loads(line)["timestamp"] for line in lines],
+                         ["2024-01-02T03:04:05.000006", "2024-01-02T03:04:06"])
+
+
+@unittest.skipUnless(production_storage.CLOUD_AVAILABLE, "google-cloud libraries not installed")
+class ConversationLogSeedTest(unittest.TestCase):
+    def test_first_append_seeds_from_firestore_docs(self):
+        docs = _firestore_docs()
+        storage = _storage(docs)
+        storage.append_conversation_log("conv_1", docs[-1:])
+        history = storage.read_conversation_log("conv_1")
+        self.assertEqual([doc["id"] for doc in history], ["msg_1", "msg_2"])
+        self.assertEqual(history[0]["timestamp"], datetime(2024, 1, 2, 3, 4, 5, 6))
+
+
+@unittest.skipUnless(production_storage.CLOUD_AVAILABLE, "google-cloud libraries not installed")
+class MessageCacheBlobTest(unittest.TestCase):
+    def test_round_trip_restores_timestamps(self):
+        storage = _storage([])
+        storage.write_message_cache_blob("conv_1", _firestore_docs(), message_count=2)
+        messages = storage.read_message_cache_blob("conv_1", message_count=2)
+        self.assertEqual([message["timestamp"] for message in messages],
+                         [doc["timestamp"] for doc in _firestore_docs()])
+        self.assertIs(type(messages[0]["timestamp"]), datetime)
+
+    def test_blob_built_at_an_older_count_is_stale(self):
+        storage = _storage([])
+        storage.write_message_cache_blob("conv_1", _firestore_docs(), message_count=2)
+        self.assertIsNone(storage.read_message_cache_blob("conv_1", message_count=3))
+
+
+if __name__ == "__main__":
+    unittest.main()